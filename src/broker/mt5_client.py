@@ -2,13 +2,31 @@
 from __future__ import annotations
 
 import logging
-from typing import Optional, Tuple
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-import MetaTrader5 as mt5
+import numpy as np
 import pandas as pd
 
+from core.lazy import lazy_import
+
+mt5 = lazy_import("MetaTrader5")
+
 log = logging.getLogger(__name__)
 
+# Antall ferske bars som hentes per poll når cachen er varm (siste bar + ev. nylig lukket)
+_INCREMENTAL_BARS = 3
+
+# Samme time-dtype som pd.to_datetime(..., unit="s") gir i installert pandas
+# (datetime64[ns] i pandas 2.x, datetime64[s] fra pandas 3)
+_TIME_DTYPE = pd.to_datetime(np.zeros(1, dtype=np.int64), unit="s").dtype
+
+
+@lru_cache(maxsize=1)
+def _order_types() -> Dict[str, int]:
+    # Funksjon i stedet for modulkonstant så MetaTrader5 ikke lastes ved import
+    return {"buy": mt5.ORDER_TYPE_BUY, "sell": mt5.ORDER_TYPE_SELL}
+
 
 class MT5Client:
     """
@@ -16,13 +34,19 @@ class MT5Client:
       - initialize/login (smartere connect)
       - sikre symbol
       - hente bars til DataFrame
-      - sende market-ordre
+      - sende market-ordre (enkeltvis eller i batch)
       - lukke posisjoner
     """
 
     def __init__(self) -> None:
         self._connected: bool = False
         self._account_id: Optional[int] = None
+        # Siste DataFrame per (symbol, timeframe) – brukes for inkrementell henting
+        self._bar_cache: Dict[Tuple[str, int], pd.DataFrame] = {}
+        # Symboler som allerede er valgt i Market Watch i denne sesjonen
+        self._ensured: Set[str] = set()
+        # Ferdig utfylte request-maler per symbol (kopieres per ordre)
+        self._req_tmpl: Dict[str, Dict[str, Any]] = {}
 
     # -----------------------------
     # Tilkobling / init / login
@@ -46,6 +70,8 @@ class MT5Client:
             mt5.shutdown()
         except Exception:
             pass
+        self._bar_cache.clear()
+        self._ensured.clear()
 
         # Normaliser path: hvis mappe er oppgitt, prøv å finne terminal64.exe
         path_used = mt5_path
@@ -133,6 +159,8 @@ class MT5Client:
         finally:
             self._connected = False
             self._account_id = None
+            self._bar_cache.clear()
+            self._ensured.clear()
             log.info("MT5 shutdown complete")
 
     # -----------------------------
@@ -141,31 +169,110 @@ class MT5Client:
     def ensure_symbol(self, symbol: str) -> bool:
         if not symbol:
             return False
+        if symbol in self._ensured:
+            return True
         if mt5.symbol_info(symbol) is None:
             log.error("Symbol not found: %s", symbol)
             return False
         if not mt5.symbol_select(symbol, True):
             log.error("Failed to select symbol: %s | %s", symbol, mt5.last_error())
             return False
+        self._ensured.add(symbol)
         return True
 
-    def rates_df(self, symbol: str, timeframe: int, count: int = 300) -> pd.DataFrame:
-        if not self.ensure_symbol(symbol):
-            return pd.DataFrame()
+    @staticmethod
+    def _rates_to_df(rates) -> pd.DataFrame:
+        """
+        Bygg OHLCV-DataFrame direkte fra MT5 sitt structured ndarray.
+        Kolonnene plukkes rett fra feltene (ingen mellomliggende full-skjema DataFrame),
+        og epoch-sekunder tolkes som datetime64 uten to_datetime-parsing.
+        """
+        cols = {"time": rates["time"].astype("datetime64[s]").astype(_TIME_DTYPE)}
+        for name in ("open", "high", "low", "close", "tick_volume"):
+            cols[name] = rates[name]
+        return pd.DataFrame(cols, copy=False)
+
+    def _fetch_rates_df(self, symbol: str, timeframe: int, count: int) -> Optional[pd.DataFrame]:
         rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
         if rates is None:
             log.error("copy_rates_from_pos returned None for %s | %s", symbol, mt5.last_error())
+            return None
+        return self._rates_to_df(rates)
+
+    def rates_df(self, symbol: str, timeframe: int, count: int = 300) -> pd.DataFrame:
+        """
+        Hent siste 'count' bars som DataFrame (egen kopi – cachen deles ikke ut).
+        Første kall henter hele historikken; senere kall henter kun de siste
+        _INCREMENTAL_BARS barene og skjøter dem på cachen (siste bar kan fortsatt
+        være under utvikling, så den erstattes). Ved hull eller større 'count'
+        enn cachen dekker gjøres en full henting.
+        """
+        if not self.ensure_symbol(symbol):
             return pd.DataFrame()
-        df = pd.DataFrame(rates)
+
+        key = (symbol, timeframe)
+        cached = self._bar_cache.get(key)
+        df: Optional[pd.DataFrame] = None
+        if cached is not None and len(cached) >= count and count > _INCREMENTAL_BARS:
+            new = self._fetch_rates_df(symbol, timeframe, _INCREMENTAL_BARS)
+            if new is None:
+                return pd.DataFrame()
+            # Sammenhengende kun hvis første nye bar allerede finnes i cachen
+            if not new.empty and (cached["time"] == new["time"].iloc[0]).any():
+                head = cached[cached["time"] < new["time"].iloc[0]]
+                df = pd.concat([head, new], ignore_index=True).tail(count).reset_index(drop=True)
+
+        if df is None:
+            df = self._fetch_rates_df(symbol, timeframe, count)
+            if df is None:
+                self._bar_cache.pop(key, None)
+                return pd.DataFrame()
+
         if df.empty:
+            self._bar_cache.pop(key, None)
             return df
-        df["time"] = pd.to_datetime(df["time"], unit="s")
-        return df[["time", "open", "high", "low", "close", "tick_volume"]]
+        self._bar_cache[key] = df
+        # Kalleren får en egen kopi: indikatorkolonner eller in-place-endringer skal ikke
+        # lekke inn i cachen og neste inkrementelle skjøt (kopien av ~count rader er billig
+        # mot IPC-kallet, og er også trygg på pandas 2 uten copy-on-write)
+        return df.copy()
+
+    def rates_arrays(self, symbol: str, timeframe: int, count: int = 300) -> Dict[str, np.ndarray]:
+        """
+        Hent siste 'count' bars som rå numpy-arrays (views rett på MT5 sitt structured
+        array, ingen kopi og ingen pandas). 'time' er epoch-sekunder (int64),
+        OHLC er float64 – klart for vektoriserte indikatorer/TA-Lib.
+        Tom dict ved feil.
+        """
+        if not self.ensure_symbol(symbol):
+            return {}
+        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
+        if rates is None:
+            log.error("copy_rates_from_pos returned None for %s | %s", symbol, mt5.last_error())
+            return {}
+        return {name: rates[name] for name in ("time", "open", "high", "low", "close", "tick_volume")}
+
+    def rates_pl(self, symbol: str, timeframe: int, count: int = 300):
+        """
+        Som rates_df, men returnerer polars.DataFrame bygget rett fra MT5 sitt
+        structured array (pl.from_numpy). Krever den valgfrie avhengigheten 'polars'
+        (pip install trading-ea[polars]). None ved feil.
+        """
+        import polars as pl
+
+        if not self.ensure_symbol(symbol):
+            return None
+        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
+        if rates is None:
+            log.error("copy_rates_from_pos returned None for %s | %s", symbol, mt5.last_error())
+            return None
+        cols = ["time", "open", "high", "low", "close", "tick_volume"]
+        return pl.from_numpy(rates[cols]).with_columns(pl.from_epoch("time", time_unit="s"))
 
     # -----------------------------
     # Ordre / posisjoner
     # -----------------------------
-    def market_order(
+    def _market_request(
         self,
         symbol: str,
         side: str,               # "buy" | "sell"
@@ -174,49 +281,107 @@ class MT5Client:
         tp: Optional[float] = None,
         deviation: int = 10,
         comment: str = "",
-    ) -> Tuple[bool, Optional[int], Optional[int]]:
-        assert side in ("buy", "sell"), "side must be 'buy' or 'sell'"
+    ) -> Optional[Dict[str, Any]]:
+        """Bygg request-dict for market-ordre. None hvis side er ugyldig eller symbolet ikke kan brukes."""
+        if side not in ("buy", "sell"):
+            log.error("Ugyldig side=%r for %s (må være 'buy' eller 'sell')", side, symbol)
+            return None
         if not self.ensure_symbol(symbol):
-            return False, None, None
+            return None
 
-        type_map = {"buy": mt5.ORDER_TYPE_BUY, "sell": mt5.ORDER_TYPE_SELL}
-        req = {
-            "action": mt5.TRADE_ACTION_DEAL,
-            "symbol": symbol,
-            "type": type_map[side],
-            "volume": float(volume),
-            "deviation": int(deviation),
-            "type_filling": mt5.ORDER_FILLING_IOC,
-            "comment": comment,
-        }
+        base = self._req_tmpl.get(symbol)
+        if base is None:
+            base = self._req_tmpl[symbol] = {
+                "action": mt5.TRADE_ACTION_DEAL,
+                "symbol": symbol,
+                "type_filling": mt5.ORDER_FILLING_IOC,
+            }
+        req = base.copy()
+        req["type"] = _order_types()[side]
+        req["volume"] = float(volume)
+        req["deviation"] = int(deviation)
+        req["comment"] = comment
+        # MT5 godtar ikke None-verdier – utelat SL/TP som ikke er satt
         if sl is not None:
             req["sl"] = float(sl)
         if tp is not None:
             req["tp"] = float(tp)
+        return req
 
-        res = mt5.order_send(req)
+    @staticmethod
+    def _check_result(req: Dict[str, Any], res: Any) -> Tuple[bool, Optional[int], Optional[int]]:
+        side = "buy" if req["type"] == mt5.ORDER_TYPE_BUY else "sell"
         ok = bool(res) and res.retcode == mt5.TRADE_RETCODE_DONE
         if not ok:
             log.error("order_send failed | symbol=%s side=%s vol=%s | retcode=%s | %s",
-                      symbol, side, volume, getattr(res, "retcode", None), mt5.last_error())
+                      req["symbol"], side, req["volume"], getattr(res, "retcode", None), mt5.last_error())
             return False, getattr(res, "order", None), getattr(res, "retcode", None)
 
         log.info("order_send OK | symbol=%s side=%s vol=%s | order_id=%s price=%.5f",
-                 symbol, side, volume, res.order, getattr(res, "price", float("nan")))
+                 req["symbol"], side, req["volume"], res.order, getattr(res, "price", float("nan")))
         return True, res.order, res.retcode
 
+    def _send(self, req: Dict[str, Any]) -> Tuple[bool, Optional[int], Optional[int]]:
+        try:
+            res = mt5.order_send(req)
+        except Exception as e:
+            log.error("order_send kastet unntak | symbol=%s | %s", req["symbol"], e)
+            res = None
+        return self._check_result(req, res)
+
+    def market_orders_batch(
+        self,
+        orders: List[Dict[str, Any]],
+    ) -> List[Tuple[bool, Optional[int], Optional[int]]]:
+        """
+        Send flere market-ordre etter hverandre.
+        - orders: liste med kwargs som for market_order (symbol, side, volume, sl, tp, ...).
+        - Sendes sekvensielt: MetaTrader5-pakken har ingen order_send_async og dokumenterer
+          ikke at order_send er trådsikker, så N ordre koster fortsatt N rundturer.
+        - Ugyldige ordre (ukjent side, symbol som ikke kan brukes) gir (False, None, None)
+          uten å stoppe resten av batchen.
+        - Returnerer (ok, order_id, retcode) per ordre, i samme rekkefølge som input.
+        """
+        results: List[Tuple[bool, Optional[int], Optional[int]]] = []
+        for kwargs in orders:
+            req = self._market_request(**kwargs)
+            results.append((False, None, None) if req is None else self._send(req))
+        return results
+
+    def market_order(
+        self,
+        symbol: str,
+        side: str,               # "buy" | "sell"
+        volume: float,
+        sl: Optional[float] = None,
+        tp: Optional[float] = None,
+        deviation: int = 10,
+        comment: str = "",
+    ) -> Tuple[bool, Optional[int], Optional[int]]:
+        req = self._market_request(symbol, side, volume, sl, tp, deviation, comment)
+        if req is None:
+            return False, None, None
+        return self._send(req)
+
     def close_position_by_ticket(
         self,
         ticket: int,
         deviation: int = 10,
         comment: str = "close_position",
     ) -> Tuple[bool, Optional[int], Optional[int]]:
-        pos = next((p for p in mt5.positions_get() or [] if p.ticket == ticket), None)
+        positions = mt5.positions_get(ticket=ticket)
+        pos = positions[0] if positions else None
         if not pos:
             log.error("Position not found for ticket=%s", ticket)
             return False, None, None
         side = "sell" if pos.type == mt5.ORDER_TYPE_BUY else "buy"
-        return self.market_order(symbol=pos.symbol, side=side, volume=pos.volume, deviation=deviation, comment=comment)
+        req = self._market_request(symbol=pos.symbol, side=side, volume=pos.volume, deviation=deviation, comment=comment)
+        if req is None:
+            return False, None, None
+        # Bind ordren til ticketen: er posisjonen lukket i mellomtiden, avviser serveren
+        # ordren i stedet for å åpne en ny motsatt posisjon
+        req["position"] = int(ticket)
+        return self._send(req)
 
     # -----------------------------
     # Nyttige helpers
@@ -1,33 +1,38 @@
 # core/config.py
 from __future__ import annotations
+from functools import lru_cache
 from typing import Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
+import json
 import os
 
 def _find_env_file() -> Optional[str]:
     """
-    Finn .env ved å gå oppover fra denne filen til prosjektroten.
-    Stopper når vi ser mappen som inneholder 'scripts' og 'src' (vanlig layout),
-    eller når vi har gått 5 nivåer.
+    Finn .env ved å gå oppover fra denne filen mot filsystemroten.
+    Første treff vinner (f.eks. src/core -> src -> prosjektrot).
     """
     # Tillat manuell overstyring via miljøvariabel
     manual = os.getenv("EA__ENV_FILE")
     if manual and Path(manual).is_file():
         return manual
 
-    here = Path(__file__).resolve()
-    for parent in [here.parent] + list(here.parents):
-        # heuristikk: prosjektrot har ofte /scripts og /src
-        if (parent / ".env").is_file():
-            return str(parent / ".env")
-        if (parent.parent / ".env").is_file():
-            # i tilfelle core/config.py ligger i src/core/
-            return str(parent.parent / ".env")
+    for parent in Path(__file__).resolve().parents:
+        cand = parent / ".env"
+        if cand.is_file():
+            return str(cand)
     return None
 
 
+# Slås opp én gang ved import, ikke per Settings()-instans
+_ENV_FILE = _find_env_file()
+
+
 class Settings(BaseSettings):
+    # Kart-feltene (*_raw) godtar to formater:
+    #   - legacy:  "MAIN:123,TEST:456"
+    #   - JSON:    '{"MAIN": 123, "TEST": 456}'  (tillater komma/kolon i verdier, f.eks. passord)
+
     # --- Multi-konto (obligatorisk) ---
     accounts_raw: Optional[str] = None
     account_key: Optional[str] = None
@@ -63,7 +68,7 @@ class Settings(BaseSettings):
 
     model_config = SettingsConfigDict(
         env_prefix="EA__",
-        env_file=_find_env_file() or ".env",
+        env_file=_ENV_FILE or ".env",
         extra="ignore",
     )
 
@@ -71,36 +76,65 @@ class Settings(BaseSettings):
     _accounts: Dict[str, int] = {}
     _passwords: Dict[str, str] = {}
     _servers: Dict[str, str] = {}
+    _default_account_id: Optional[int] = None
 
     def __init__(self, **data):
         super().__init__(**data)
         self._accounts = self._parse_int_map(self.accounts_raw)
         self._passwords = self._parse_str_map(self.passwords_raw)
         self._servers = self._parse_str_map(self.servers_raw)
+        # Kartene er uforanderlige etter init – løs standardkonto én gang
+        self._default_account_id = self._resolve_default_account_id()
 
     @staticmethod
+    def _parse_json_map(raw: str) -> Dict[str, object]:
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Ugyldig JSON i kontokart: {e}") from e
+        if not isinstance(data, dict):
+            raise ValueError("Kontokart i JSON må være et objekt, f.eks. {\"MAIN\": 123}")
+        return data
+
+    @staticmethod
+    @lru_cache(maxsize=None)
     def _parse_int_map(raw: Optional[str]) -> Dict[str, int]:
+        # Cachet på rå-strengen; returnert dict skal ikke muteres.
         out: Dict[str, int] = {}
         if not raw:
             return out
-        for part in [p.strip() for p in raw.split(",") if p.strip()]:
-            if ":" not in part:
-                continue
-            k, v = (s.strip() for s in part.split(":", 1))
-            if k and v.isdigit():
+        if raw.lstrip().startswith("{"):
+            for k, v in Settings._parse_json_map(raw).items():
+                if isinstance(v, bool):
+                    continue
+                if isinstance(v, str) and v.strip().isdigit():
+                    v = int(v)
+                if k and isinstance(v, int):
+                    out[k] = v
+            return out
+        for part in raw.split(","):
+            k, sep, v = part.partition(":")
+            k, v = k.strip(), v.strip()
+            if sep and k and v.isdigit():
                 out[k] = int(v)
         return out
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def _parse_str_map(raw: Optional[str]) -> Dict[str, str]:
+        # Cachet på rå-strengen; returnert dict skal ikke muteres.
         out: Dict[str, str] = {}
         if not raw:
             return out
-        for part in [p.strip() for p in raw.split(",") if p.strip()]:
-            if ":" not in part:
-                continue
-            k, v = (s.strip() for s in part.split(":", 1))
-            if k and v:
+        if raw.lstrip().startswith("{"):
+            for k, v in Settings._parse_json_map(raw).items():
+                if k and isinstance(v, str) and v:
+                    out[k] = v
+            return out
+        for part in raw.split(","):
+            k, sep, v = part.partition(":")
+            k, v = k.strip(), v.strip()
+            if sep and k and v:
                 out[k] = v
         return out
 
@@ -114,21 +148,27 @@ class Settings(BaseSettings):
                 return k
         return None
 
-    def get_account_id(self, key_or_id: Optional[str | int] = None) -> int:
-        if isinstance(key_or_id, int):
-            return key_or_id
-        if isinstance(key_or_id, str) and key_or_id:
-            if key_or_id.isdigit():
-                return int(key_or_id)
-            if key_or_id in self._accounts:
-                return self._accounts[key_or_id]
+    def _resolve_default_account_id(self) -> Optional[int]:
         if self.account_id:
             return int(self.account_id)
         if self.account_key and self.account_key in self._accounts:
             return self._accounts[self.account_key]
         if self._accounts:
             return next(iter(self._accounts.values()))
-        raise ValueError("Ingen MT5-konto konfigurert. Sett EA__ACCOUNTS eller oppgi --account.")
+        return None
+
+    def get_account_id(self, key_or_id: Optional[str | int] = None) -> int:
+        if isinstance(key_or_id, int):
+            return key_or_id
+        if isinstance(key_or_id, str) and key_or_id:
+            if key_or_id.isdigit():
+                return int(key_or_id)
+            acc_id = self._accounts.get(key_or_id)
+            if acc_id is not None:
+                return acc_id
+        if self._default_account_id is None:
+            raise ValueError("Ingen MT5-konto konfigurert. Sett EA__ACCOUNTS eller oppgi --account.")
+        return self._default_account_id
 
     def get_login_params(self, key_or_id: Optional[str | int] = None) -> tuple[int, Optional[str], Optional[str], Optional[str]]:
         acc_id = self.get_account_id(key_or_id)
@@ -142,5 +182,11 @@ class Settings(BaseSettings):
         return acc_id, key_used, password, server
 
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Delt Settings-instans; .env leses og valideres kun én gang per prosess."""
+    return Settings()
+
+
 # Global settings
-settings = Settings()
+settings = get_settings()
@@ -0,0 +1,39 @@
+# core/lazy.py
+from __future__ import annotations
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+class _MissingModule(ModuleType):
+    """Plassholder for en modul som ikke er installert: feiler først når den brukes."""
+
+    def __getattr__(self, attr: str):
+        if attr.startswith("__"):
+            # Dunder-oppslag (repr, pickle, inspect) skal oppføre seg som for en vanlig modul
+            raise AttributeError(attr)
+        raise ModuleNotFoundError(f"No module named {self.__name__!r}", name=self.__name__)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Importer en modul lat: modulobjektet returneres med en gang, men selve
+    modulkoden (og tunge C-extensions/DLL-init) kjøres først ved første attributt-oppslag.
+    Er modulen allerede importert (eller byttet ut i sys.modules, f.eks. i tester),
+    returneres den som den er. Er den ikke installert (f.eks. MetaTrader5 på Linux),
+    returneres en plassholder som kaster ModuleNotFoundError ved første attributt-oppslag,
+    så moduler som bare importerer den kan lastes og testes.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        # Ikke registrert i sys.modules: en senere ekte import/stub skal ikke skygges
+        return _MissingModule(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,15 +1,49 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 
+_listener: logging.handlers.QueueListener | None = None
+
+
+class _RawQueueHandler(logging.handlers.QueueHandler):
+    """
+    Legger selve recorden (msg + args, ev. exc_info) i køen. Standard prepare() kaller
+    self.format() – dvs. %-interpolering og traceback-formatering på kallerens tråd –
+    for at records skal kunne piklees til andre prosesser; her går køen kun til en
+    tråd i samme prosess, så all formatering kan skje i lytteren.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
 def setup_logging(level: str = "DEBUG"):
-    """Setter opp logging til stdout med fast format."""
+    """
+    Setter opp logging til stdout med fast format.
+    Formatering og skriving skjer i en bakgrunnstråd (QueueHandler/QueueListener),
+    så trading-løkka bare legger records i en kø.
+    """
+    global _listener
     root = logging.getLogger()
     if not root.handlers:
+        # Dropp tråd-/prosessnavn-oppslag per record (brukes ikke i formatet)
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+
         handler = logging.StreamHandler(sys.stdout)
         formatter = logging.Formatter(
             "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
         )
         handler.setFormatter(formatter)
-        root.addHandler(handler)
+
+        q: queue.SimpleQueue = queue.SimpleQueue()
+        root.addHandler(_RawQueueHandler(q))
+        _listener = logging.handlers.QueueListener(q, handler, respect_handler_level=True)
+        _listener.start()
+        # Tøm køen ved avslutning så siste linjer ikke går tapt
+        atexit.register(_listener.stop)
 
     root.setLevel(level.upper())
@@ -2,53 +2,79 @@
 from __future__ import annotations
 
 import logging
-from typing import Tuple
+from functools import lru_cache
+from typing import Dict, Tuple
 
-import MetaTrader5 as mt5
+import numpy as np
 import pandas as pd
 
 from broker.mt5_client import MT5Client
+from core.lazy import lazy_import
+
+mt5 = lazy_import("MetaTrader5")
 
 log = logging.getLogger(__name__)
 
-# MT5-konstanter for timeframes
-TIMEFRAME_MAP = {
-    "M1": mt5.TIMEFRAME_M1,
-    "M5": mt5.TIMEFRAME_M5,
-    "M15": mt5.TIMEFRAME_M15,
-    "M30": mt5.TIMEFRAME_M30,
-    "H1": mt5.TIMEFRAME_H1,
-    "H4": mt5.TIMEFRAME_H4,
-    "D1": mt5.TIMEFRAME_D1,
-}
+
+@lru_cache(maxsize=1)
+def _timeframe_map() -> Dict[str, int]:
+    """MT5-konstanter for timeframes (bygges ved første bruk, ikke ved import)."""
+    return {
+        "M1": mt5.TIMEFRAME_M1,
+        "M5": mt5.TIMEFRAME_M5,
+        "M15": mt5.TIMEFRAME_M15,
+        "M30": mt5.TIMEFRAME_M30,
+        "H1": mt5.TIMEFRAME_H1,
+        "H4": mt5.TIMEFRAME_H4,
+        "D1": mt5.TIMEFRAME_D1,
+    }
+
+
+def __getattr__(name: str):
+    # Bakoverkompatibelt: `from data.feeds import TIMEFRAME_MAP` virker fortsatt
+    if name == "TIMEFRAME_MAP":
+        return _timeframe_map()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+@lru_cache(maxsize=16)
 def resolve_timeframe(tf_key: str) -> Tuple[str, int]:
     """
     Valider og oversett en nøkkel som 'M15' -> ('M15', mt5.TIMEFRAME_M15).
-    Kaster ValueError hvis ugyldig.
+    Kaster ValueError hvis ugyldig. Resultatet caches per tf_key.
     """
     key = (tf_key or "").upper()
-    if key not in TIMEFRAME_MAP:
-        raise ValueError(f"Ukjent timeframe '{tf_key}'. Gyldige: {', '.join(TIMEFRAME_MAP.keys())}")
-    return key, TIMEFRAME_MAP[key]
+    tf = _timeframe_map().get(key)
+    if tf is None:
+        raise ValueError(f"Ukjent timeframe '{tf_key}'. Gyldige: {', '.join(_timeframe_map().keys())}")
+    return key, tf
 
 
-def get_bars(mt: MT5Client, symbol: str, tf_key: str, count: int = 300) -> pd.DataFrame:
+def get_bars(
+    mt: MT5Client,
+    symbol: str,
+    tf_key: str,
+    count: int = 300,
+    as_arrays: bool = False,
+) -> pd.DataFrame | Dict[str, np.ndarray]:
     """
     Hent siste 'count' bars for symbol/timeframe som DataFrame (OHLCV).
     Bruker MT5Client.rates_df under panseret.
+    Med as_arrays=True returneres i stedet dict med numpy-arrays (MT5Client.rates_arrays).
     """
     _, tf_val = resolve_timeframe(tf_key)
+    if as_arrays:
+        return mt.rates_arrays(symbol, tf_val, count=count)
     return mt.rates_df(symbol, tf_val, count=count)
 
 
-def is_new_bar(prev_time, df: pd.DataFrame) -> tuple[bool, pd.Timestamp | None]:
+def is_new_bar(prev_time, df: pd.DataFrame) -> tuple[bool, np.datetime64 | None]:
     """
     Sjekk om siste rad i df representerer en ny bar (vs. prev_time).
-    Returnerer (is_new, current_time).
+    Returnerer (is_new, current_time). current_time er np.datetime64 lest rett
+    fra underliggende array (ingen iloc/Timestamp-boksing).
     """
     if df is None or df.empty:
         return False, None
-    cur = df["time"].iloc[-1]
-    return (prev_time is None or cur != prev_time), cur
+    cur = df["time"].to_numpy()[-1]
+    return (prev_time is None or bool(cur != prev_time)), cur
@@ -2,16 +2,98 @@
 from __future__ import annotations
 
 import logging
-from typing import Optional
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
 
-import MetaTrader5 as mt5
+from core.lazy import lazy_import
+
+mt5 = lazy_import("MetaTrader5")
 
 log = logging.getLogger(__name__)
 
+# TTL for cachede MT5-oppslag (sekunder)
+SYMBOL_SPECS_TTL = 60.0
+EQUITY_TTL = 1.0
+
+
+class SymbolSpecs(NamedTuple):
+    """
+    Broker-regler for et symbol som trengs til posisjonssizing og stop-sjekker.
+    Feltene er ferdig konvertert, så sizing er ren aritmetikk etter ett cache-oppslag.
+    Deles med runneren (én cache av symbol_info-feltene, ikke to).
+    """
+    tick_size: float     # trade_tick_size, faller tilbake til point
+    tick_value: float
+    volume_min: float
+    volume_max: float
+    volume_step: float
+    point: float
+    stops_level: int
+
+    @property
+    def min_dist(self) -> float:
+        """Minste SL/TP-avstand fra pris (stops_level * point)."""
+        return self.stops_level * self.point
+
+
+_specs_cache: Dict[str, Tuple[float, SymbolSpecs]] = {}
+_equity_cache: Optional[Tuple[float, float]] = None
+
+
+def invalidate_symbol(symbol: Optional[str] = None) -> None:
+    """Tøm cachede symbol-regler (ett symbol, eller alle hvis symbol=None)."""
+    if symbol is None:
+        _specs_cache.clear()
+    else:
+        _specs_cache.pop(symbol, None)
+
+
+def get_symbol_specs(symbol: str) -> Optional[SymbolSpecs]:
+    """SymbolSpecs for symbolet, cachet i SYMBOL_SPECS_TTL sekunder. None hvis MT5 ikke kjenner det."""
+    now = time.monotonic()
+    hit = _specs_cache.get(symbol)
+    if hit is not None and now - hit[0] < SYMBOL_SPECS_TTL:
+        return hit[1]
+
+    si = mt5.symbol_info(symbol)
+    if si is None:
+        log.error("symbol_info(%s) er None", symbol)
+        _specs_cache.pop(symbol, None)
+        return None
+
+    specs = SymbolSpecs(
+        tick_size=float(si.trade_tick_size or si.point or 0.0),
+        tick_value=float(si.trade_tick_value or 0.0),
+        volume_min=float(si.volume_min or 0.01),
+        volume_max=float(si.volume_max or 100.0),
+        volume_step=float(si.volume_step or 0.01),
+        point=float(si.point or 0.0),
+        stops_level=int(getattr(si, "stops_level", 0) or 0),
+    )
+    _specs_cache[symbol] = (now, specs)
+    return specs
+
+
+def _get_equity() -> Optional[float]:
+    global _equity_cache
+    now = time.monotonic()
+    if _equity_cache is not None and now - _equity_cache[0] < EQUITY_TTL:
+        return _equity_cache[1]
+
+    ai = mt5.account_info()
+    if ai is None:
+        log.error("account_info() er None")
+        _equity_cache = None
+        return None
+    _equity_cache = (now, float(ai.equity))
+    return _equity_cache[1]
+
 
 def _round_to_step(value: float, step: float) -> float:
     """
-    Avrund volum til nærmeste gyldige 'step' (ikke gulv/ceil, men round-to-nearest).
+    Avrund volum til nærmeste gyldige 'step' (ikke gulv/ceil, men round-to-nearest;
+    halve steg rundes til partall som Pythons round()).
+    Ytre round(..., 6) fjerner FP-støy (f.eks. 3 * 0.1 = 0.30000000000000004).
     """
     if step <= 0:
         return value
@@ -33,25 +115,21 @@ def calc_volume_for_risk(
         loss_per_lot = ticks * tick_value
         lots = (equity * risk_fraction) / loss_per_lot
 
-    Vi leser broker-regler fra MT5:
+    Vi leser broker-regler fra MT5 (cachet i SYMBOL_SPECS_TTL sekunder):
       - volume_min / volume_max / volume_step
       - tick_size (trade_tick_size/point)
       - tick_value (pnl per tick for 1 lot)
+    Equity caches i EQUITY_TTL sekunder.
     """
     if risk_fraction <= 0:
         log.warning("risk_fraction <= 0, hopper over posisjonssizing")
         return None
 
-    si = mt5.symbol_info(symbol)
-    if si is None:
-        log.error("symbol_info(%s) er None", symbol)
+    specs = get_symbol_specs(symbol)
+    if specs is None:
         return None
 
-    tick_size = float(si.trade_tick_size or si.point or 0.0)
-    tick_value = float(si.trade_tick_value or 0.0)
-    volume_min = float(si.volume_min or 0.01)
-    volume_max = float(si.volume_max or 100.0)
-    volume_step = float(si.volume_step or 0.01)
+    tick_size, tick_value, volume_min, volume_max, volume_step = specs[:5]
 
     if tick_size <= 0 or tick_value <= 0:
         log.error(
@@ -65,11 +143,9 @@ def calc_volume_for_risk(
         log.error("Stop loss avstand er 0. entry=%s sl=%s", entry_price, stop_loss_price)
         return None
 
-    ai = mt5.account_info()
-    if ai is None:
-        log.error("account_info() er None")
+    equity = _get_equity()
+    if equity is None:
         return None
-    equity = float(ai.equity)
 
     risk_money = equity * risk_fraction
     ticks = distance / tick_size
@@ -3,20 +3,24 @@ from __future__ import annotations
 
 import argparse
 import logging
+import operator
 import sys
 import time
-from typing import Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
 from datetime import datetime, date, timedelta, timezone
+from types import SimpleNamespace
 
 import MetaTrader5 as mt5
-import pandas as pd
+import numpy as np
 
 from core.config import settings
 from core.logging import setup_logging
 from broker.mt5_client import MT5Client
 from data.feeds import TIMEFRAME_MAP
-from risk.position_sizing import calc_volume_for_risk
+from risk.position_sizing import SymbolSpecs, calc_volume_for_risk, get_symbol_specs, invalidate_symbol
 
+from strategy.base import BarFrame
 from strategy.breakout_close import BreakoutClose  # beholdes for testing
 from strategy.donchian_breakout import DonchianBreakout
 
@@ -28,6 +32,15 @@ def _server_now(symbol: str) -> datetime:
         return datetime.fromtimestamp(int(tick.time))
     return datetime.now()
 
+def _sum_deals(deals) -> float:
+    """Sum av profit + swap + commission over deals (én numpy-reduksjon)."""
+    return float(np.fromiter(
+        (float(getattr(d, "profit", 0.0)) + float(getattr(d, "swap", 0.0)) + float(getattr(d, "commission", 0.0))
+         for d in deals),
+        dtype=np.float64,
+        count=len(deals),
+    ).sum())
+
 def realized_pnl_today_server(symbol: str) -> float:
     now_srv = _server_now(symbol)
     day_start_srv = now_srv.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -44,12 +57,7 @@ def realized_pnl_today_server(symbol: str) -> float:
             deals = None
     if deals is None:
         return 0.0
-    total = 0.0
-    for d in deals:
-        total += float(getattr(d, "profit", 0.0))
-        total += float(getattr(d, "swap", 0.0))
-        total += float(getattr(d, "commission", 0.0))
-    return total
+    return _sum_deals(deals)
 
 def resolve_symbol(cli_symbol: Optional[str], strategy_obj) -> str:
     log = logging.getLogger("runner")
@@ -64,30 +72,77 @@ def resolve_symbol(cli_symbol: Optional[str], strategy_obj) -> str:
     log.warning("Ingen symbol angitt – faller tilbake til %s", fallback)
     return fallback
 
+def _tf_seconds(tf_const: int) -> int:
+    """Lengde på én bar i sekunder for en MT5 timeframe-konstant (0 hvis ukjent)."""
+    return {
+        mt5.TIMEFRAME_M1: 60,
+        mt5.TIMEFRAME_M5: 5 * 60,
+        mt5.TIMEFRAME_M15: 15 * 60,
+        mt5.TIMEFRAME_M30: 30 * 60,
+        mt5.TIMEFRAME_H1: 60 * 60,
+        mt5.TIMEFRAME_H4: 4 * 60 * 60,
+        mt5.TIMEFRAME_D1: 24 * 60 * 60,
+    }.get(tf_const, 0)
+
+def _server_offset_sec(symbol: str) -> int:
+    """
+    Serverens tidssone-offset mot lokal epoch (bar- og tick-tider fra MT5 er i servertid).
+    Avrundes til nærmeste halvtime så en litt gammel siste tick ikke gir feil offset.
+    """
+    tick = mt5.symbol_info_tick(symbol)
+    if not tick or not getattr(tick, "time", None):
+        return 0
+    return int(round((int(tick.time) - time.time()) / 1800.0)) * 1800
+
 def timeframe_to_mt5(tf_code: str) -> int:
     tf_code = tf_code.upper()
     if tf_code not in TIMEFRAME_MAP:
         raise ValueError(f"Ukjent timeframe: {tf_code}")
     return TIMEFRAME_MAP[tf_code]
 
-def fetch_df(symbol: str, tf_const: int, bars: int) -> Optional[pd.DataFrame]:
-    rates = mt5.copy_rates_from_pos(symbol, tf_const, 0, bars)
+# Siste structured array per (symbol, timeframe); etter første henting hentes kun de nyeste barene
+_INCREMENTAL_BARS = 2
+_RATES_CACHE: Dict[Tuple[str, int], np.ndarray] = {}
+
+def _copy_rates(symbol: str, tf_const: int, count: int) -> Optional[np.ndarray]:
+    rates = mt5.copy_rates_from_pos(symbol, tf_const, 0, count)
     if rates is None:
         logging.getLogger("runner").warning("copy_rates_from_pos(%s) ga None. last_error=%s", symbol, mt5.last_error())
         return None
     if len(rates) == 0:
         logging.getLogger("runner").warning("Ingen rates for %s (len=0). last_error=%s", symbol, mt5.last_error())
         return None
-    try:
-        df = pd.DataFrame(rates)
-        if df.empty:
+    return rates
+
+def fetch_bars(symbol: str, tf_const: int, bars: int) -> Optional[BarFrame]:
+    """
+    Hent siste 'bars' barer som BarFrame (numpy-views rett på MT5 sitt structured array).
+    Første kall henter hele vinduet; senere kall henter kun _INCREMENTAL_BARS barer og
+    skjøter dem på cachen (siste bar kan fortsatt være under utvikling, så den erstattes).
+    Ved hull (f.eks. etter frakobling) gjøres en full henting.
+    DataFrame bygges først hvis strategien trenger det (BarFrame.to_df).
+    """
+    key = (symbol, tf_const)
+    cached = _RATES_CACHE.get(key)
+    rates: Optional[np.ndarray] = None
+    if cached is not None and len(cached) >= bars and bars > _INCREMENTAL_BARS:
+        new = _copy_rates(symbol, tf_const, _INCREMENTAL_BARS)
+        if new is None:
+            return None
+        # Sammenhengende kun hvis første nye bar allerede finnes i cachen
+        t0 = new["time"][0]
+        i = int(np.searchsorted(cached["time"], t0))
+        if i < len(cached) and cached["time"][i] == t0 and new.dtype == cached.dtype:
+            rates = np.concatenate((cached[:i], new))[-bars:]
+
+    if rates is None:
+        rates = _copy_rates(symbol, tf_const, bars)
+        if rates is None:
+            _RATES_CACHE.pop(key, None)
             return None
-        df["time"] = pd.to_datetime(df["time"], unit="s")
-        df.rename(columns={"time": "datetime"}, inplace=True)
-        return df
-    except Exception as e:
-        logging.getLogger("runner").exception("Klarte ikke konvertere rates til DataFrame: %s", e)
-        return None
+
+    _RATES_CACHE[key] = rates
+    return BarFrame.from_rates(rates)
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Kjør EA live/paper mot MT5")
@@ -208,48 +263,66 @@ def init_mt(account_hint: Optional[str]) -> MT5Client:
 
 # ---------------------- Risiko / posisjoner ----------------------
 
-def has_open_position_count(symbol: str) -> int:
-    poss = mt5.positions_get(symbol=symbol)
-    return len(poss) if poss else 0
-
-def min_stop_distance_ok(symbol: str, entry: float, sl: float) -> bool:
-    si = mt5.symbol_info(symbol)
-    if si is None:
+@dataclass
+class BarSnapshot:
+    """
+    Konto- og posisjonsdata hentet én gang per bar.
+    Risiko-helperne leser herfra i stedet for å spørre MT5 hver for seg.
+    """
+    ai: Any
+    positions: tuple
+    ts: float
+    _pnl_today: Optional[float] = field(default=None, repr=False)
+
+    @classmethod
+    def take(cls) -> "BarSnapshot":
+        return cls(mt5.account_info(), tuple(mt5.positions_get() or ()), time.monotonic())
+
+    @property
+    def equity(self) -> float:
+        return float(self.ai.equity) if self.ai and self.ai.equity else 0.0
+
+    def pnl_today(self, symbol: str) -> float:
+        """Realisert PnL for server-dagen, hentet maks én gang per bar (daily-guard og heartbeat)."""
+        if self._pnl_today is None:
+            self._pnl_today = realized_pnl_today_server(symbol)
+        return self._pnl_today
+
+def has_open_position_count(symbol: str, snap: BarSnapshot) -> int:
+    return sum(1 for p in snap.positions if p.symbol == symbol)
+
+def min_stop_distance_ok(sm: Optional[SymbolSpecs], entry: float, sl: float) -> bool:
+    if sm is None:
         return False
-    point = float(si.point or 0.0)
-    stops_points = int(getattr(si, "stops_level", 0) or 0)
-    min_dist = stops_points * point
-    if min_dist <= 0:
+    if sm.min_dist <= 0:
         return True
     dist = abs(entry - sl)
-    return dist >= min_dist
+    return dist >= sm.min_dist
 
-def apply_caps(volume: float, risk_fraction: float) -> float:
+def apply_caps(volume: float, risk_fraction: float, snap: BarSnapshot, cfg: SimpleNamespace) -> float:
     vol = float(volume)
 
-    max_vol = float(getattr(settings, "max_volume", 0.0) or 0.0)
+    max_vol = cfg.max_volume
     if max_vol > 0.0 and vol > max_vol:
         vol = max_vol
 
-    max_risk_money = float(getattr(settings, "max_risk_money", 0.0) or 0.0)
+    max_risk_money = cfg.max_risk_money
     if max_risk_money > 0.0 and risk_fraction > 0.0:
-        ai = mt5.account_info()
-        if ai and ai.equity and ai.equity > 0:
-            intended_risk_money = float(ai.equity) * float(risk_fraction)
+        if snap.equity > 0:
+            intended_risk_money = snap.equity * float(risk_fraction)
             if intended_risk_money > 0 and max_risk_money < intended_risk_money:
                 scale = max_risk_money / intended_risk_money
                 vol = vol * scale
 
     return max(0.0, vol)
 
-def normalize_volume(symbol: str, volume: float) -> float:
-    si = mt5.symbol_info(symbol)
-    if si is None:
+def normalize_volume(sm: Optional[SymbolSpecs], volume: float) -> float:
+    if sm is None:
         return max(0.0, volume)
 
-    volume_min = float(si.volume_min or 0.01)
-    volume_max = float(si.volume_max or 100.0)
-    volume_step = float(si.volume_step or 0.01)
+    volume_min = sm.volume_min
+    volume_max = sm.volume_max
+    volume_step = sm.volume_step
 
     if volume_step > 0:
         volume = round(round(volume / volume_step) * volume_step, 6)
@@ -261,32 +334,38 @@ def normalize_volume(symbol: str, volume: float) -> float:
 
     return max(0.0, volume)
 
-def _loss_per_lot_if_sl(symbol: str, entry: float, sl: float) -> float:
-    si = mt5.symbol_info(symbol)
-    if not si:
-        return 0.0
-    tick_size = float(si.trade_tick_size or si.point or 0.0)
-    tick_value = float(si.trade_tick_value or 0.0)
-    if tick_size <= 0 or tick_value <= 0:
+def _loss_per_lot_if_sl(sm: Optional[SymbolSpecs], entry: float, sl: float) -> float:
+    if sm is None or sm.tick_size <= 0 or sm.tick_value <= 0:
         return 0.0
-    ticks = abs(entry - sl) / tick_size
-    return ticks * tick_value
+    ticks = abs(entry - sl) / sm.tick_size
+    return ticks * sm.tick_value
 
-def current_portfolio_risk_percent() -> float:
-    ai = mt5.account_info()
-    if not ai or not ai.equity:
+def current_portfolio_risk_percent(snap: BarSnapshot) -> float:
+    eq = snap.equity
+    if eq <= 0.0:
+        return 0.0
+    poss = [p for p in snap.positions if getattr(p, "sl", 0.0)]
+    if not poss:
         return 0.0
-    eq = float(ai.equity)
-    total = 0.0
-    for p in (mt5.positions_get() or []):
-        if not getattr(p, "sl", 0.0):
-            continue
-        entry = float(p.price_open)
-        sl = float(p.sl)
-        loss_per_lot = _loss_per_lot_if_sl(p.symbol, entry, sl)
-        if loss_per_lot <= 0:
-            continue
-        total += loss_per_lot * float(p.volume)
+
+    # Ett SymbolSpecs-oppslag per unike symbol, deretter én vektorisert reduksjon
+    tick_size: Dict[str, float] = {}
+    tick_value: Dict[str, float] = {}
+    for sym in {p.symbol for p in poss}:
+        sm = get_symbol_specs(sym)
+        tick_size[sym] = sm.tick_size if sm else 0.0
+        tick_value[sym] = sm.tick_value if sm else 0.0
+
+    n = len(poss)
+    entry = np.fromiter((p.price_open for p in poss), dtype=np.float64, count=n)
+    sl = np.fromiter((p.sl for p in poss), dtype=np.float64, count=n)
+    vol = np.fromiter((p.volume for p in poss), dtype=np.float64, count=n)
+    ts = np.fromiter((tick_size[p.symbol] for p in poss), dtype=np.float64, count=n)
+    tv = np.fromiter((tick_value[p.symbol] for p in poss), dtype=np.float64, count=n)
+
+    valid = (ts > 0) & (tv > 0)
+    ticks = np.abs(entry[valid] - sl[valid]) / ts[valid]
+    total = float((ticks * tv[valid] * vol[valid]).sum())
     return (total / eq) * 100.0
 
 # ---------------------- Daily loss guard ----------------------
@@ -311,7 +390,7 @@ class DailyLossGuard:
             self._lock_day_key = None
             logging.getLogger("runner").info("📆 Ny server-dag: daily-loss reset.")
 
-    def should_block_new_trades(self, symbol: str) -> bool:
+    def should_block_new_trades(self, symbol: str, snap: BarSnapshot) -> bool:
         self._reset_if_new_server_day(symbol)
         if self.locked_for_today:
             return True
@@ -319,9 +398,8 @@ class DailyLossGuard:
         if self.max_loss_pct <= 0.0 and self.max_loss_money <= 0.0:
             return False
 
-        ai = mt5.account_info()
-        equity = float(ai.equity) if ai and ai.equity else 0.0
-        pnl_today = realized_pnl_today_server(symbol)
+        equity = snap.equity
+        pnl_today = snap.pnl_today(symbol)
         dd_money = -pnl_today if pnl_today < 0 else 0.0
 
         threshold_money = 0.0
@@ -335,7 +413,7 @@ class DailyLossGuard:
             logging.getLogger("runner").warning(
                 "⛔ Max daily loss truffet (server-dag): drawdown=%.2f (%.2f%%) | grenser: money=%.2f pct=%.2f%%. "
                 "Ingen nye trades i dag.",
-                dd_money, dd_pct, self.max_daily_loss_money, self.max_loss_pct
+                dd_money, dd_pct, self.max_loss_money, self.max_loss_pct
             )
             self.locked_for_today = True
             self._announced = False
@@ -366,15 +444,20 @@ def realized_pnl_last_24h() -> float:
     if deals is None:
         return 0.0
 
-    total = 0.0
-    for d in deals:
-        total += float(getattr(d, "profit", 0.0))
-        total += float(getattr(d, "swap", 0.0))
-        total += float(getattr(d, "commission", 0.0))
-    return total
+    return _sum_deals(deals)
 
 # ---------------------- Order send (robust) ----------------------
 
+# Faste deler av market-ordre (fallback uten MT5Client.market_order)
+_ORDER_TYPE = {"buy": mt5.ORDER_TYPE_BUY, "sell": mt5.ORDER_TYPE_SELL}
+_ORDER_TEMPLATE = {
+    "action": mt5.TRADE_ACTION_DEAL,
+    "deviation": 20,
+    "magic": 0,
+    "type_time": mt5.ORDER_TIME_GTC,
+    "type_filling": mt5.ORDER_FILLING_IOC,
+}
+
 def send_market_order(
     mt: MT5Client,
     *,
@@ -390,8 +473,8 @@ def send_market_order(
         return mt.market_order(symbol=symbol, side=side, volume=volume, sl=sl, tp=tp, comment=comment)
 
     side = side.lower()
-    type_map = {"buy": mt5.ORDER_TYPE_BUY, "sell": mt5.ORDER_TYPE_SELL}
-    if side not in type_map:
+    order_type = _ORDER_TYPE.get(side)
+    if order_type is None:
         log.error("Ugyldig side=%s", side)
         return False, None, None
 
@@ -402,16 +485,12 @@ def send_market_order(
 
     price = tick.ask if side == "buy" else tick.bid
     request = {
-        "action": mt5.TRADE_ACTION_DEAL,
+        **_ORDER_TEMPLATE,
         "symbol": symbol,
-        "type": type_map[side],
+        "type": order_type,
         "volume": float(volume),
         "price": float(price),
-        "deviation": 20,
-        "magic": 0,
         "comment": comment,
-        "type_time": mt5.ORDER_TIME_GTC,
-        "type_filling": mt5.ORDER_FILLING_IOC,
     }
     if sl is not None:
         request["sl"] = float(sl)
@@ -428,13 +507,16 @@ def send_market_order(
 
     return True, getattr(res, "order", None), getattr(res, "deal", None)
 
-def adjust_tp_to_exact_2r(symbol: str, side: str, sl: float) -> None:
+_pos_time = operator.attrgetter("time")
+
+def adjust_tp_to_exact_2r(symbol: str, side: str, sl: float, sm: Optional[SymbolSpecs]) -> None:
     log = logging.getLogger("runner")
     poss = mt5.positions_get(symbol=symbol) or []
     if not poss:
         log.warning("Fant ingen åpen posisjon for %s ved TP-justering.", symbol)
         return
-    pos = sorted(poss, key=lambda p: getattr(p, "time", 0))[-1]
+    # Nyeste posisjon; reversed() så siste av like tidsstempler vinner, som før
+    pos = max(reversed(poss), key=_pos_time)
     fill = float(pos.price_open)
 
     r = abs(fill - sl)
@@ -444,11 +526,8 @@ def adjust_tp_to_exact_2r(symbol: str, side: str, sl: float) -> None:
 
     new_tp = fill + (2.0 * r if side.lower() == "buy" else -2.0 * r)
 
-    si = mt5.symbol_info(symbol)
-    if si:
-        point = float(si.point or 0.0)
-        stops_points = int(getattr(si, "stops_level", 0) or 0)
-        min_dist = stops_points * point
+    if sm is not None:
+        min_dist = sm.min_dist
         if min_dist > 0:
             if side.lower() == "buy" and (new_tp - fill) < min_dist:
                 new_tp = fill + min_dist
@@ -476,6 +555,9 @@ def adjust_tp_to_exact_2r(symbol: str, side: str, sl: float) -> None:
 
 # ---------------------- Hovedprogram ----------------------
 
+# Heartbeat-linja (konto/risiko/PnL) logges maks én gang per minutt, uavhengig av timeframe
+_HEARTBEAT_SEC = 60.0
+
 def build_strategy(args: argparse.Namespace):
     """
     Dynamisk strategi-instansiering basert på --strategy.
@@ -523,7 +605,15 @@ def main() -> int:
     bars = args.bars
     poll_sec = args.poll or float(getattr(settings, "polling_sec", 5.0))
     mode = args.mode
-    base_risk_fraction = float(getattr(settings, "risk_percent", 1.0)) / 100.0
+
+    # Settings leses én gang – hovedløkka bruker kun disse verdiene
+    cfg = SimpleNamespace(
+        use_risk_sizing=bool(getattr(settings, "use_risk_sizing", True)),
+        risk_percent=float(getattr(settings, "risk_percent", 1.0)),
+        max_volume=float(getattr(settings, "max_volume", 0.0) or 0.0),
+        max_risk_money=float(getattr(settings, "max_risk_money", 0.0) or 0.0),
+    )
+    base_risk_fraction = cfg.risk_percent / 100.0
 
     # Limits/styring
     max_positions_per_symbol = int(getattr(settings, "max_positions_per_symbol", 3))
@@ -537,8 +627,8 @@ def main() -> int:
     )
     log.info(
         "Risikostyring: %s | risk_percent=%.2f%% | max_pos/symbol=%d | max_total_risk=%.2f%% | max_daily_loss=%.2f%% / %.2f",
-        "ON" if getattr(settings, "use_risk_sizing", True) else "OFF",
-        float(getattr(settings, "risk_percent", 1.0)),
+        "ON" if cfg.use_risk_sizing else "OFF",
+        cfg.risk_percent,
         max_positions_per_symbol,
         max_total_risk_percent,
         max_daily_loss_pct,
@@ -565,34 +655,58 @@ def main() -> int:
     # Daily loss guard
     dguard = DailyLossGuard(max_daily_loss_pct, max_daily_loss_money)
 
+    order_comment = f"{strat.name}: risk={cfg.risk_percent:.2f}%"
+
     # Hovedløkke
     try:
-        last_bar_time = None
+        # Strategi-init (bl.a. JIT-kompilering/lasting av numba-cache) før første bar
+        t0 = time.perf_counter()
+        strat.on_start()
+        log.debug("%s.on_start ferdig på %.3fs", strat.name, time.perf_counter() - t0)
+
+        last_bar_ts = -1  # epoch-sekunder (servertid) for siste behandlede bar
+        tf_sec = _tf_seconds(tf_const)
+        next_bar_open: Optional[int] = None  # servertid (epoch) for neste bar-åpning
+        srv_offset = 0
+        last_heartbeat = float("-inf")  # monotonic-tid for siste heartbeat-linje
         while True:
-            df = fetch_df(symbol, tf_const, bars)
-            if df is None or df.empty:
+            # Sov frem til like før neste bar i stedet for å polle hele baren;
+            # kun rundt bar-skiftet polles det med poll_sec-oppløsning.
+            if next_bar_open is not None:
+                remaining = next_bar_open - (time.time() + srv_offset)
+                if remaining > 2 * poll_sec:
+                    time.sleep(min(remaining - poll_sec, tf_sec))
+                    continue
+
+            frame = fetch_bars(symbol, tf_const, bars)
+            if frame is None:
                 log.warning("Mangler kursdata for %s (%s). Prøver igjen...", symbol, timeframe_code)
                 time.sleep(poll_sec)
                 continue
 
-            current_bar_time = df["datetime"].iloc[-1]
-            if last_bar_time is not None and current_bar_time == last_bar_time:
+            bar_ts = int(frame.time[-1])
+            if bar_ts == last_bar_ts:
                 time.sleep(poll_sec)
                 continue
-            last_bar_time = current_bar_time
-
-            # Heartbeat
-            last_close = float(df["close"].iloc[-1])
-            ai = mt5.account_info()
-            equity = float(ai.equity) if ai and ai.equity else 0.0
-            pnl_24h = realized_pnl_last_24h()
-            used_risk = current_portfolio_risk_percent()
-            pnl_today_srv = realized_pnl_today_server(symbol)
-            used_risk = current_portfolio_risk_percent()
-            log.info("🕒 Ny bar: %s | close=%.5f | Equity=%.2f | Realisert i dag (server)=%.2f | Brukt risiko=%.2f%%",
-                     current_bar_time, last_close, equity, pnl_today_srv, used_risk)
-
-            if dguard.should_block_new_trades(symbol):
+            last_bar_ts = bar_ts
+            # Siste bars OHLC leses én gang fra BarFrame-viewene og gjenbrukes under
+            last_close = float(frame.close[-1])
+            if tf_sec > 0:
+                srv_offset = _server_offset_sec(symbol)
+                next_bar_open = bar_ts + tf_sec
+
+            # Én konto/posisjons-snapshot per bar – deles av heartbeat og risiko-sjekker
+            snap = BarSnapshot.take()
+
+            # Heartbeat – maks én gang per _HEARTBEAT_SEC; dagens PnL deles med daily-guard via snap
+            used_risk: Optional[float] = None
+            if snap.ts - last_heartbeat >= _HEARTBEAT_SEC and log.isEnabledFor(logging.INFO):
+                last_heartbeat = snap.ts
+                used_risk = current_portfolio_risk_percent(snap)
+                log.info("🕒 Ny bar: %s | close=%.5f | Equity=%.2f | Realisert i dag (server)=%.2f | Brukt risiko=%.2f%%",
+                         frame.datetime_last, last_close, snap.equity, snap.pnl_today(symbol), used_risk)
+
+            if dguard.should_block_new_trades(symbol, snap):
                 if not dguard._announced:
                     logging.getLogger("runner").info("🔒 Daily-loss aktiv – ingen nye trades i dag (server-dag).")
                     dguard._announced = True
@@ -600,7 +714,7 @@ def main() -> int:
                 continue
 
             # Posisjonskvote per symbol
-            open_count = has_open_position_count(symbol)
+            open_count = has_open_position_count(symbol, snap)
             if open_count >= max_positions_per_symbol:
                 log.info("📌 %s har allerede %d posisjoner (tak=%d) – hopper nytt entry.",
                          symbol, open_count, max_positions_per_symbol)
@@ -610,7 +724,7 @@ def main() -> int:
             # Globalt risikotak – justér effektiv risiko hvis nødvendig
             risk_fraction = base_risk_fraction
             if max_total_risk_percent > 0.0:
-                used = current_portfolio_risk_percent()
+                used = used_risk if used_risk is not None else current_portfolio_risk_percent(snap)
                 remaining = max(0.0, max_total_risk_percent - used)
                 if remaining <= 0.0:
                     log.info("⛔ Porteføljerisiko nå %.2f%% ≥ tak %.2f%% – hopper ordre.", used, max_total_risk_percent)
@@ -628,26 +742,33 @@ def main() -> int:
                 risk_fraction = effective
 
             # Strategi-signal
-            signal = strat.on_bar(df)
+            signal = strat.on_bar_np(frame)
 
-            # Nøytral "no signal"-logging (ingen interne testreferanser)
-            if not signal or signal.side not in ("buy", "sell"):
+            # Nøytral "no signal"-logging (ingen interne testreferanser) – kun på DEBUG
+            if (not signal or signal.side not in ("buy", "sell")) and log.isEnabledFor(logging.DEBUG):
                 try:
-                    close = float(df["close"].iloc[-1])
-                    high = float(df["high"].iloc[-1])
-                    low = float(df["low"].iloc[-1])
+                    high = float(frame.high[-1])
+                    low = float(frame.low[-1])
+                    # Kanalnivåene regnes kun her, når DEBUG faktisk logges
+                    hi = lo = None
+                    donchian = getattr(strat, "_donchian", None)
+                    if donchian is not None and len(frame) > getattr(strat, "lookback", len(frame)):
+                        hi, lo = donchian(frame)
                     logging.getLogger("runner").debug(
-                        "No signal | strat=%s | close=%.5f high=%.5f low=%.5f | bars=%d",
-                        strat.__class__.__name__, close, high, low, len(df)
+                        "No signal | strat=%s | close=%.5f high=%.5f low=%.5f | hi=%s lo=%s | bars=%d",
+                        strat.__class__.__name__, last_close, high, low,
+                        f"{hi:.5f}" if hi is not None else "n/a",
+                        f"{lo:.5f}" if lo is not None else "n/a",
+                        len(frame)
                     )
                 except Exception:
                     pass
 
             if signal and signal.side in ("buy", "sell"):
                 try:
-                    entry = float(signal.price or df["close"].iloc[-1])
+                    entry = float(signal.price or last_close)
                 except Exception:
-                    entry = float(df["close"].iloc[-1])
+                    entry = last_close
 
                 sl = float(signal.meta["sl"]) if signal.meta and "sl" in signal.meta else None
                 tp = float(signal.meta["tp"]) if signal.meta and "tp" in signal.meta else None
@@ -657,13 +778,14 @@ def main() -> int:
                     time.sleep(poll_sec)
                     continue
 
-                if not min_stop_distance_ok(symbol, entry, sl):
+                sm = get_symbol_specs(symbol)
+                if not min_stop_distance_ok(sm, entry, sl):
                     log.warning("⛔ SL for nærme (stops_level). entry=%.5f sl=%.5f symbol=%s", entry, sl, symbol)
                     time.sleep(poll_sec)
                     continue
 
                 # Volum ut fra risiko
-                if getattr(settings, "use_risk_sizing", True):
+                if cfg.use_risk_sizing:
                     vol = calc_volume_for_risk(
                         symbol=symbol,
                         entry_price=entry,
@@ -679,23 +801,20 @@ def main() -> int:
 
                 # Caps og normalisering
                 vol_before = vol
-                vol = apply_caps(vol, risk_fraction)
-                vol = normalize_volume(symbol, vol)
-                log.debug("Volum | beregnet=%.6f | etter_caps=%.6f | normalisert=%.6f",
-                          vol_before, apply_caps(vol_before, risk_fraction), vol)
+                vol_capped = apply_caps(vol, risk_fraction, snap, cfg)
+                vol = normalize_volume(sm, vol_capped)
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Volum | beregnet=%.6f | etter_caps=%.6f | normalisert=%.6f",
+                              vol_before, vol_capped, vol)
 
                 if vol <= 0:
                     log.warning("⛔ Volum ble 0 etter caps/normalisering – hopper ordre.")
                     time.sleep(poll_sec)
                     continue
 
-                si = mt5.symbol_info(symbol)
-                if si:
+                if sm:
                     log.info("Vol-regler %s | min=%.6f step=%.6f max=%.6f",
-                             symbol,
-                             float(si.volume_min or 0),
-                             float(si.volume_step or 0),
-                             float(si.volume_max or 0))
+                             symbol, sm.volume_min, sm.volume_step, sm.volume_max)
 
                 if mode == "paper":
                     log.info(
@@ -710,15 +829,16 @@ def main() -> int:
                         volume=vol,
                         sl=sl,
                         tp=tp,
-                        comment=f"{strat.name}: risk={float(getattr(settings, 'risk_percent', 1.0)):.2f}%",
+                        comment=order_comment,
                     )
                     if ok:
                         log.info(
                             "✅ LIVE: %s %.2f lots @%.5f | SL=%.5f TP=%s | order=%s deal=%s",
                             signal.side, vol, entry, sl, f"{tp:.5f}" if tp else "n/a", order_id, deal_id
                         )
-                        adjust_tp_to_exact_2r(symbol, signal.side, sl)
+                        adjust_tp_to_exact_2r(symbol, signal.side, sl, sm)
                     else:
+                        invalidate_symbol(symbol)
                         log.error("❌ LIVE: Ordre feilet.")
 
             time.sleep(poll_sec)
@@ -729,6 +849,10 @@ def main() -> int:
         log.exception("Uventet feil i hovedløkke: %s", e)
         return 1
     finally:
+        try:
+            strat.on_stop()
+        except Exception as e:
+            log.warning("%s.on_stop feilet: %s", strat.name, e)
         try:
             if hasattr(mt, "shutdown") and callable(getattr(mt, "shutdown")):
                 mt.shutdown()
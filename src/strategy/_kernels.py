@@ -0,0 +1,217 @@
+# src/strategy/_kernels.py
+"""
+Numeriske kjerner for strategiene, skrevet som eksplisitte løkker over float64-arrays.
+Med numba installert (pip install trading-ea[numba]) kompileres de ved import med
+eksplisitte signaturer (cache=True, så normalt lastes de fra __pycache__), og første
+on_bar betaler ingen JIT-stopp. Uten numba kjører de som vanlig Python – de regner kun
+på siste vindu, så det er fortsatt billig.
+
+Alt regnes bevisst i float64: strategiene sammenligner pris mot kanalnivåer med streng
+ulikhet, og float32 (~7 siffer) er for grovt for f.eks. indekser/krypto med to desimaler.
+Per-bar-arbeidet er O(1) på inkrementell state, så det er ingen båndbredde å spare.
+"""
+from __future__ import annotations
+
+import logging
+
+import numpy as np
+
+try:
+    from numba import njit, prange, types as _nt
+
+    # Runneren logger på DEBUG; numba dumper ellers bytecode/IR for hver kompilering
+    logging.getLogger("numba").setLevel(logging.WARNING)
+
+    # Én signatur per kjerne. Arrays typet som read-only med layout "A" tar imot alt
+    # float64: C-arrays, views rett på MT5s structured array og pandas 3s read-only
+    # to_numpy()-arrays – uten at numba kompilerer nye varianter ved første kall.
+    _A = _nt.Array(_nt.float64, 1, "A", readonly=True)
+    _F8, _I8 = _nt.float64, _nt.int64
+    _SIG_DONCHIAN = _nt.UniTuple(_F8, 2)(_A, _A, _I8)
+    _SIG_ATR_SMA = _F8(_A, _A, _A, _I8)
+    _SIG_WILDER_ATR = _nt.UniTuple(_F8, 2)(_A, _A, _A, _I8, _I8, _F8, _F8, _F8, _F8)
+    _SIG_EWM = _F8[::1](_A, _F8)
+    _SIG_EWM_LAST = _F8(_A, _I8, _I8, _F8, _F8)
+    _SIG_DONCHIAN_GRID = _nt.int8[::1](_A, _A, _A, _nt.Array(_F8, 2, "A", readonly=True))
+except ImportError:  # numba er valgfri
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+    prange = range
+    _SIG_DONCHIAN = _SIG_ATR_SMA = _SIG_WILDER_ATR = _SIG_EWM = _SIG_EWM_LAST = None
+    _SIG_DONCHIAN_GRID = None
+
+
+@njit(_SIG_DONCHIAN, cache=True)
+def donchian(high, low, lookback):
+    """
+    (høyeste high, laveste low) over de 'lookback' barene *før* siste bar.
+    NaN hvis historikken er for kort.
+    """
+    n = high.shape[0]
+    if lookback <= 0 or n < lookback + 1:
+        return np.nan, np.nan
+    hi = high[n - 1 - lookback]
+    lo = low[n - 1 - lookback]
+    for i in range(n - lookback, n - 1):
+        if high[i] > hi:
+            hi = high[i]
+        if low[i] < lo:
+            lo = low[i]
+    return hi, lo
+
+
+@njit(_SIG_ATR_SMA, cache=True)
+def atr_sma(high, low, close, period):
+    """Siste ATR som enkelt snitt av true range over 'period' barer. NaN hvis for kort."""
+    n = close.shape[0]
+    if period <= 0 or n < period + 1:
+        return np.nan
+    total = 0.0
+    for i in range(n - period, n):
+        pc = close[i - 1]
+        tr = high[i] - low[i]
+        a = abs(high[i] - pc)
+        b = abs(low[i] - pc)
+        if a > tr:
+            tr = a
+        if b > tr:
+            tr = b
+        total += tr
+    return total / period
+
+
+@njit(_SIG_WILDER_ATR, cache=True)
+def wilder_atr(high, low, close, start, end, atr, prev_close, w_old, w_new):
+    """
+    Før Wilder-ATR (ewm(adjust=False) av true range) over barene [start, end).
+    'atr'/'prev_close' er staten før 'start'; start == 0 seeder med første bars high-low.
+    Returnerer (atr, close for bar end-1). Samme aritmetikk som pandas' ewm-løkke
+    (derfor ikke fastmath), så resultatet er bit-likt med den vektoriserte varianten.
+    """
+    i = start
+    if i == 0 and end > 0:
+        atr = abs(high[0] - low[0])
+        prev_close = close[0]
+        i = 1
+    while i < end:
+        h = high[i]
+        l = low[i]
+        tr = abs(h - l)
+        a = abs(h - prev_close)
+        b = abs(l - prev_close)
+        if a > tr:
+            tr = a
+        if b > tr:
+            tr = b
+        if atr != tr:
+            atr = (w_old * atr + w_new * tr) / (w_old + w_new)
+        prev_close = close[i]
+        i += 1
+    return atr, prev_close
+
+
+@njit(_SIG_EWM, cache=True)
+def ewm(x, com):
+    """
+    ewm(com=com, adjust=False).mean() som array (forutsetter ingen NaN).
+    Samme aritmetikk som pandas, så verdiene er bit-like med .ewm().
+    """
+    n = x.shape[0]
+    out = np.empty(n)
+    if n == 0:
+        return out
+    alpha = 1.0 / (1.0 + com)
+    w_old = 1.0 - alpha
+    w = x[0]
+    out[0] = w
+    for i in range(1, n):
+        v = x[i]
+        if w != v:
+            w = (w_old * w + alpha * v) / (w_old + alpha)
+        out[i] = w
+    return out
+
+
+@njit(_SIG_EWM_LAST, cache=True)
+def ewm_last(x, start, end, prev, com):
+    """
+    Før ewm(com=com, adjust=False) over x[start:end] fra staten 'prev' og returner
+    siste verdi; start == 0 seeder med x[0]. Samme aritmetikk som ewm().
+    """
+    alpha = 1.0 / (1.0 + com)
+    w_old = 1.0 - alpha
+    i = start
+    if i == 0 and end > 0:
+        prev = x[0]
+        i = 1
+    while i < end:
+        v = x[i]
+        if prev != v:
+            prev = (w_old * prev + alpha * v) / (w_old + alpha)
+        i += 1
+    return prev
+
+
+@njit(_SIG_DONCHIAN_GRID, parallel=True, cache=True)
+def donchian_grid(high, low, close, params):
+    """
+    DonchianBreakout-beslutning på siste bar for hver rad i 'params'
+    [lookback, atr_period, ema_filter (0 = av), intra (0/1), atr_floor_mult].
+    Returnerer int8 per rad: +1 buy, -1 sell, 0 ingen. Radene er uavhengige og fordeles
+    over kjernene med prange (numba slipper GIL-en); ATR/EMA regnes fra første bar, som
+    DonchianBreakout gjør på et voksende vindu, med samme aritmetikk (bit-likt).
+    """
+    n = close.shape[0]
+    m = params.shape[0]
+    out = np.zeros(m, np.int8)
+    if n == 0:
+        return out
+    for k in prange(m):
+        lookback = int(params[k, 0])
+        atr_period = int(params[k, 1])
+        ema_span = int(params[k, 2])
+        intra = params[k, 3] != 0.0
+        floor_mult = params[k, 4]
+        if n < max(lookback + 1, atr_period + 2, ema_span + 2):
+            continue
+        hi, lo = donchian(high, low, lookback)
+
+        price = close[n - 1]
+        long_ok = True
+        short_ok = True
+        if ema_span > 0:
+            ema = ewm_last(close, 0, n, 0.0, (ema_span - 1.0) / 2.0)
+            long_ok = price > ema
+            short_ok = price < ema
+
+        alpha = 1.0 / (1.0 + (1.0 / (1.0 / atr_period) - 1.0))
+        atr, _ = wilder_atr(high, low, close, 0, n, 0.0, 0.0, 1.0 - alpha, alpha)
+        if floor_mult > 0.0:
+            atr = max(atr, floor_mult * price / 10000.0)
+        if not (atr > 0.0 and np.isfinite(atr)):
+            continue
+
+        px_high = high[n - 1] if intra else price
+        px_low = low[n - 1] if intra else price
+        if long_ok and px_high > hi:
+            out[k] = 1
+        elif short_ok and px_low < lo:
+            out[k] = -1
+    return out
+
+
+def warmup() -> None:
+    """
+    Kall kjernene én gang på små arrays før live-løkka. Med numba er de allerede
+    kompilert ved import; dette fanger ev. feil i cache/kompilering ved oppstart.
+    """
+    x = np.linspace(1.0, 2.0, 8)
+    donchian(x, x, 3)
+    atr_sma(x, x, x, 3)
+    wilder_atr(x, x, x, 0, 8, 0.0, 0.0, 0.5, 0.5)
+    ewm(x, 1.0)
+    ewm_last(x, 0, 8, 0.0, 1.0)
+    donchian_grid(x, x, x, np.array([[3.0, 3.0, 0.0, 0.0, 0.0]]))
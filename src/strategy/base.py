@@ -2,23 +2,115 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Any, Optional
+from dataclasses import dataclass, field
+from typing import Any, Mapping, Optional
 
+import numpy as np
 import pandas as pd
 
 
-@dataclass
+@dataclass(slots=True)
 class Signal:
     """
     Representerer et handelssignal ved bar-close.
     side:  "buy" | "sell" | None
     price: typisk close-prisen for signalbaren (valgfritt, men nyttig for logging)
     meta:  valgfri bærepose for ekstra data (SL/TP-beregning, debug, osv.)
+    slots=True: ingen __dict__ per instans – billigere å lage på hver bar.
     """
     side: Optional[str]  # "buy" | "sell" | None
     price: Optional[float] = None
-    meta: dict[str, Any] | None = None
+    meta: Mapping[str, Any] | None = None
+
+
+@dataclass(slots=True)
+class BarFrame:
+    """
+    Lettvekts OHLCV-container med kolonner som numpy-arrays.
+    Fra MT5 (from_rates) er kolonnene views rett på det structured arrayet – ingen kopi.
+    time:  epoch-sekunder (int64)
+    DataFrame bygges først ved behov (to_df) og caches.
+    """
+    time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    tick_volume: np.ndarray
+    _df: Optional[pd.DataFrame] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_rates(cls, rates: np.ndarray) -> "BarFrame":
+        return cls(
+            time=rates["time"],
+            open=rates["open"],
+            high=rates["high"],
+            low=rates["low"],
+            close=rates["close"],
+            tick_volume=rates["tick_volume"],
+        )
+
+    @staticmethod
+    def has_time_key(df: pd.DataFrame) -> bool:
+        """
+        True hvis df har en 'time'-kolonne som kan brukes som bar-tid: datetime64
+        (også tz-aware) eller heltall (epoch). Tekst fra f.eks. read_csv uten
+        parse_dates regnes som manglende tid.
+        """
+        if "time" not in df.columns:
+            return False
+        dtype = df["time"].dtype
+        return (isinstance(dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_dtype(dtype)
+                or pd.api.types.is_integer_dtype(dtype))
+
+    @classmethod
+    def from_df(cls, df: pd.DataFrame) -> "BarFrame":
+        """
+        Kun high/low/close er påkrevd. Mangler 'open' brukes close, mangler 'tick_volume'
+        brukes 0, og mangler 'time' (eller er den ikke datetime/heltall, se has_time_key)
+        brukes løpenummer 0..n-1 (strategiene som trenger ekte bar-tid sjekker selv).
+        """
+        close = df["close"].to_numpy()
+        if cls.has_time_key(df):
+            col = df["time"]
+            if isinstance(col.dtype, pd.DatetimeTZDtype):
+                # tz-aware gir ellers object-array av Timestamps; epoch er uavhengig av tz
+                col = col.dt.tz_convert(None)
+            t = col.to_numpy()
+            if np.issubdtype(t.dtype, np.datetime64):
+                t = t.astype("datetime64[s]").astype(np.int64)
+        else:
+            t = np.arange(len(close), dtype=np.int64)
+        return cls(
+            time=t,
+            open=df["open"].to_numpy() if "open" in df.columns else close,
+            high=df["high"].to_numpy(),
+            low=df["low"].to_numpy(),
+            close=close,
+            tick_volume=(df["tick_volume"].to_numpy() if "tick_volume" in df.columns
+                         else np.zeros(len(close), dtype=np.int64)),
+            _df=df,
+        )
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    @property
+    def datetime_last(self) -> np.datetime64:
+        return np.datetime64(int(self.time[-1]), "s")
+
+    def to_df(self) -> pd.DataFrame:
+        """DataFrame med strategikontraktens kolonner ["time","open","high","low","close","tick_volume"]."""
+        if self._df is None:
+            self._df = pd.DataFrame({
+                "time": self.time.astype("datetime64[s]"),
+                "open": self.open,
+                "high": self.high,
+                "low": self.low,
+                "close": self.close,
+                "tick_volume": self.tick_volume,
+            }, copy=False)
+        return self._df
 
 
 class StrategyBase(ABC):
@@ -26,7 +118,8 @@ class StrategyBase(ABC):
     Abstrakt base for alle strategier.
 
     Kontrakt:
-      - on_bar(df) kalles ved bar-close med siste OHLCV DataFrame.
+      - on_bar(df) kalles ved bar-close med siste OHLCV DataFrame
+        (runneren kaller on_bar_np(bars), som default delegerer til on_bar).
       - returner et Signal-objekt (side="buy"/"sell" eller None).
       - df skal minst ha kolonner: ["time","open","high","low","close","tick_volume"].
 
@@ -59,3 +152,10 @@ class StrategyBase(ABC):
         Returner Signal("buy"/"sell") for ordre, eller Signal(None) for ingen handling.
         """
         ...
+
+    def on_bar_np(self, bars: BarFrame) -> Optional[Signal]:
+        """
+        Array-variant av on_bar som runneren kaller. Standard: bygg DataFrame og
+        deleger til on_bar. Strategier som regner direkte på numpy-arrays overstyrer denne.
+        """
+        return self.on_bar(bars.to_df())
@@ -1,9 +1,16 @@
 # src/strategy/breakout_close.py
 from __future__ import annotations
 
+import math
+from types import MappingProxyType
+
 import numpy as np
 import pandas as pd
-from .base import StrategyBase, Signal
+from . import _kernels
+from .base import BarFrame, StrategyBase, Signal
+
+# Delt, skrivebeskyttet tom meta for retest-kandidater (SL/TP settes først når den brukes)
+_EMPTY_META = MappingProxyType({})
 
 
 class BreakoutClose(StrategyBase):
@@ -40,6 +47,8 @@ class BreakoutClose(StrategyBase):
         self.atr_period = atr_period
         self.atr_floor_mult = atr_floor_mult
         self.breakout_mode = breakout_mode
+        # Trigg-modus avgjøres én gang, ikke med strengsammenligning per bar
+        self._mode_close = breakout_mode == "close"
         self.retest_entries = retest_entries
         self.retest_window = retest_window
         self.max_adds = max_adds
@@ -50,62 +59,62 @@ class BreakoutClose(StrategyBase):
         self._last_break_bar_index: int | None = None
         self._adds_taken: int = 0
 
+    def on_start(self) -> None:
+        # Betal ev. JIT-kompilering av kjernene før første bar
+        _kernels.warmup()
+
     @staticmethod
-    def _atr(df: pd.DataFrame, period: int) -> pd.Series:
-        h, l, c = df["high"], df["low"], df["close"]
-        tr = np.maximum(h - l, np.maximum((h - c.shift(1)).abs(), (l - c.shift(1)).abs()))
-        return tr.rolling(period, min_periods=period).mean()
+    def _atr(h: np.ndarray, l: np.ndarray, c: np.ndarray, period: int) -> float:
+        """Siste ATR-verdi (SMA av true range over 'period' barer). NaN hvis for kort historikk."""
+        f8 = np.float64  # kjernene er kompilert for float64; asarray er no-op når det allerede er det
+        return float(_kernels.atr_sma(np.asarray(h, dtype=f8), np.asarray(l, dtype=f8),
+                                      np.asarray(c, dtype=f8), period))
 
     @staticmethod
-    def _last_swing_low(df: pd.DataFrame, lb: int) -> float | None:
-        if len(df) < lb + 2:
+    def _last_swing_low(low: np.ndarray, lb: int) -> float | None:
+        # min over de 'lb' barene før siste – direkte på array-viewet, ingen kopi
+        if lb <= 0 or len(low) < lb + 2:
             return None
-        window = df["low"].iloc[-(lb + 1):-1]
-        return float(window.min()) if not window.empty else None
+        return float(low[-(lb + 1):-1].min())
 
     @staticmethod
-    def _last_swing_high(df: pd.DataFrame, lb: int) -> float | None:
-        if len(df) < lb + 2:
+    def _last_swing_high(high: np.ndarray, lb: int) -> float | None:
+        # max over de 'lb' barene før siste – direkte på array-viewet, ingen kopi
+        if lb <= 0 or len(high) < lb + 2:
             return None
-        window = df["high"].iloc[-(lb + 1):-1]
-        return float(window.max()) if not window.empty else None
+        return float(high[-(lb + 1):-1].max())
 
-    def _donchian(self, df: pd.DataFrame) -> tuple[float, float]:
+    def _donchian(self, bars: BarFrame) -> tuple[float, float]:
         """
         Donchian-kanaler basert på *forrige* N barer (ekskluderer gjeldende bar).
         Dette gjelder både for "close" og "intra" – slik at trigg-testen gir mening.
         """
-        idx = -2  # <- VIKTIG: ekskluder nåværende bar i begge modus
-        highest_n = float(df["high"].rolling(self.lookback).max().iloc[idx])
-        lowest_n = float(df["low"].rolling(self.lookback).min().iloc[idx])
-        return highest_n, lowest_n
-
-    def _compute_sl_tp(self, side: str, entry: float, df: pd.DataFrame, atr_val: float) -> tuple[float, float]:
-        floor = self.atr_floor_mult * atr_val
-        if side == "buy":
-            swing = self._last_swing_low(df, self.swing_lookback)
-            if swing is None:
-                return None, None  # type: ignore
-            sl_candidate = max(swing, entry - floor)
-            sl = min(entry - 1e-6, sl_candidate)
-            if sl >= entry:
-                return None, None  # type: ignore
-            r = entry - sl
-            tp = entry + 2.0 * r
-            return float(sl), float(tp)
+        # <- VIKTIG: ekskluder nåværende bar i begge modus (kjernen ser kun på barene før siste)
+        highest_n, lowest_n = _kernels.donchian(np.asarray(bars.high, dtype=np.float64),
+                                                np.asarray(bars.low, dtype=np.float64), self.lookback)
+        return float(highest_n), float(lowest_n)
+
+    def _compute_sl_tp(self, side: str, entry: float, bars: BarFrame, atr_val: float) -> tuple[float, float]:
+        """
+        SL ved siste swing (minst floor = atr_floor_mult * ATR unna entry), TP = 2R.
+        Regnes i "fortegnsrom" (pris * sign, sign = +1 buy / -1 sell) så buy og sell er samme
+        aritmetikk; multiplikasjon med ±1 er eksakt, så resultatet er likt de speilede grenene.
+        """
+        sign = 1.0 if side == "buy" else -1.0
+        if sign > 0:
+            swing = self._last_swing_low(bars.low, self.swing_lookback)
         else:
-            swing = self._last_swing_high(df, self.swing_lookback)
-            if swing is None:
-                return None, None  # type: ignore
-            sl_candidate = min(swing, entry + floor)
-            sl = max(entry + 1e-6, sl_candidate)
-            if sl <= entry:
-                return None, None  # type: ignore
-            r = sl - entry
-            tp = entry - 2.0 * r
-            return float(sl), float(tp)
-
-    def _maybe_retest(self, df: pd.DataFrame) -> Signal | None:
+            swing = self._last_swing_high(bars.high, self.swing_lookback)
+        if swing is None:
+            return None, None  # type: ignore
+        e = sign * entry
+        sl_s = min(e - 1e-6, max(sign * swing, e - self.atr_floor_mult * atr_val))
+        if sl_s >= e:
+            return None, None  # type: ignore
+        r = e - sl_s
+        return sign * sl_s, entry + sign * 2.0 * r
+
+    def _maybe_retest(self, bars: BarFrame, close: float, high: float, low: float) -> Signal | None:
         """
         Re-entry på retest av bruddnivå (innen retest_window barer).
         """
@@ -117,40 +126,38 @@ class BreakoutClose(StrategyBase):
             return None
 
         # hvor mange barer siden bruddet
-        current_index = len(df) - 1
+        current_index = len(bars) - 1
         if (current_index - self._last_break_bar_index) > self.retest_window:
             return None
 
-        close = float(df["close"].iloc[-1])
-        high = float(df["high"].iloc[-1])
-        low = float(df["low"].iloc[-1])
-
         if self._last_break_side == "buy":
             if low <= self._last_break_price <= high:
-                return Signal("buy", price=close, meta={})
+                return Signal("buy", price=close, meta=_EMPTY_META)
         else:
             if low <= self._last_break_price <= high:
-                return Signal("sell", price=close, meta={})
+                return Signal("sell", price=close, meta=_EMPTY_META)
 
         return None
 
     def on_bar(self, df: pd.DataFrame) -> Signal | None:
+        return self.on_bar_np(BarFrame.from_df(df))
+
+    def on_bar_np(self, bars: BarFrame) -> Signal | None:
         need = max(self.lookback, self.swing_lookback, self.atr_period) + 2
-        if len(df) < need:
+        if len(bars) < need:
             return None
 
-        atr_series = self._atr(df, self.atr_period)
-        atr = float(atr_series.iloc[-1]) if pd.notna(atr_series.iloc[-1]) else None
-        if atr is None or atr <= 0:
+        atr = self._atr(bars.high, bars.low, bars.close, self.atr_period)
+        if math.isnan(atr) or atr <= 0:  # _atr gir alltid float, så ingen pd.notna-dispatch
             return None
 
-        highest_n, lowest_n = self._donchian(df)
-        close = float(df["close"].iloc[-1])
-        high = float(df["high"].iloc[-1])
-        low = float(df["low"].iloc[-1])
+        highest_n, lowest_n = self._donchian(bars)
+        close = float(bars.close[-1])
+        high = float(bars.high[-1])
+        low = float(bars.low[-1])
 
         # 1) Primær breakout-trigg
-        if self.breakout_mode == "close":
+        if self._mode_close:
             buy_trig = close > highest_n
             sell_trig = close < lowest_n
         else:  # "intra": sammenlign barens high/low med forrige N-bars nivåer
@@ -158,37 +165,37 @@ class BreakoutClose(StrategyBase):
             sell_trig = low < lowest_n
 
         if buy_trig:
-            entry = close if self.breakout_mode == "close" else max(close, highest_n)
-            sl, tp = self._compute_sl_tp("buy", entry, df, atr)
+            entry = close if self._mode_close else max(close, highest_n)
+            sl, tp = self._compute_sl_tp("buy", entry, bars, atr)
             if sl is None or tp is None:
                 return None
             # logg brudd for ev. retest/pyramidering
             self._last_break_price = highest_n
             self._last_break_side = "buy"
-            self._last_break_bar_index = len(df) - 1
+            self._last_break_bar_index = len(bars) - 1
             self._adds_taken = 0
-            return Signal("buy", price=float(entry), meta={"sl": float(sl), "tp": float(tp)})
+            return Signal("buy", price=entry, meta={"sl": sl, "tp": tp})
 
         if sell_trig:
-            entry = close if self.breakout_mode == "close" else min(close, lowest_n)
-            sl, tp = self._compute_sl_tp("sell", entry, df, atr)
+            entry = close if self._mode_close else min(close, lowest_n)
+            sl, tp = self._compute_sl_tp("sell", entry, bars, atr)
             if sl is None or tp is None:
                 return None
             self._last_break_price = lowest_n
             self._last_break_side = "sell"
-            self._last_break_bar_index = len(df) - 1
+            self._last_break_bar_index = len(bars) - 1
             self._adds_taken = 0
-            return Signal("sell", price=float(entry), meta={"sl": float(sl), "tp": float(tp)})
+            return Signal("sell", price=entry, meta={"sl": sl, "tp": tp})
 
         # 2) Re-entry/pyramidering (frivillig)
-        re = self._maybe_retest(df)
+        re = self._maybe_retest(bars, close, high, low)
         if re:
-            entry = float(df["close"].iloc[-1])
-            sl, tp = self._compute_sl_tp(re.side, entry, df, atr)
+            entry = close
+            sl, tp = self._compute_sl_tp(re.side, entry, bars, atr)
             if sl is None or tp is None:
                 return None
             self._adds_taken += 1
-            re.meta = {"sl": float(sl), "tp": float(tp)}
+            re.meta = {"sl": sl, "tp": tp}
             return re
 
         return None
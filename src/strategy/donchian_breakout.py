@@ -1,10 +1,39 @@
 # src/strategy/donchian_breakout.py
 from __future__ import annotations
+import math
+from collections import deque
 from dataclasses import dataclass
-from typing import Optional
+from typing import Deque, Optional, Sequence, Tuple
 import numpy as np
 import pandas as pd
-from .base import StrategyBase, Signal
+from . import _kernels
+from .base import BarFrame, StrategyBase, Signal
+
+def _span_com(span: int) -> float:
+    """com for ewm(span=...)."""
+    return (float(span) - 1.0) / 2.0
+
+def _wilder_com(period: int) -> float:
+    """com for ewm(alpha=1/period) – regnet som pandas gjør (1/alpha - 1), ikke period - 1."""
+    return 1.0 / (1.0 / float(period)) - 1.0
+
+def _ewm_weights(com: float) -> Tuple[float, float]:
+    """(gammel vekt, ny vekt) for ewm(adjust=False) – samme aritmetikk som pandas."""
+    alpha = 1.0 / (1.0 + com)
+    return 1.0 - alpha, alpha
+
+def _resume_at(t: np.ndarray, last: Optional[int]) -> Optional[int]:
+    """
+    Første bar som ikke er tatt inn i staten ennå, gitt tiden 'last' for siste ferdige
+    bar staten dekker. None hvis staten må bygges på nytt (første kall, hull i dataene
+    eller 'last' er ikke lenger blant de ferdige barene [0, len(t)-1)).
+    """
+    if last is None:
+        return None
+    j = int(np.searchsorted(t, last))
+    if j < len(t) - 1 and t[j] == last:
+        return j + 1
+    return None
 
 @dataclass
 class DonchianParams:
@@ -15,6 +44,28 @@ class DonchianParams:
     breakout_mode: str = "close"      # "close" eller "intra"
     atr_floor_mult: float = 0.0
 
+def params_matrix(params: Sequence[DonchianParams]) -> np.ndarray:
+    """Parametersett som rader for batch_on_bar: [lookback, atr_period, ema_filter, intra, atr_floor_mult]."""
+    return np.array([[p.lookback, p.atr_period, p.ema_filter or 0,
+                      1.0 if p.breakout_mode == "intra" else 0.0, p.atr_floor_mult]
+                     for p in params], dtype=np.float64).reshape(-1, 5)
+
+def batch_on_bar(bfs: Sequence[BarFrame], params: np.ndarray) -> np.ndarray:
+    """
+    Evaluer DonchianBreakout på siste bar for alle kombinasjoner av symbol (BarFrame) og
+    parametersett (rader fra params_matrix) – for grid-søk/backtest over mange oppsett.
+    Returnerer int8 med form (len(bfs), len(params)): +1 buy, -1 sell, 0 ingen signal.
+    Parameterradene regnes parallelt i _kernels.donchian_grid; ingen instans-state
+    brukes, så svaret er det samme som en ny instans sitt on_bar_np på samme vindu.
+    """
+    grid = np.asarray(params, dtype=np.float64).reshape(-1, 5)
+    out = np.zeros((len(bfs), grid.shape[0]), dtype=np.int8)
+    for i, bars in enumerate(bfs):
+        out[i] = _kernels.donchian_grid(np.asarray(bars.high, dtype=np.float64),
+                                        np.asarray(bars.low, dtype=np.float64),
+                                        np.asarray(bars.close, dtype=np.float64), grid)
+    return out
+
 class DonchianBreakout(StrategyBase):
     def __init__(
         self,
@@ -36,6 +87,16 @@ class DonchianBreakout(StrategyBase):
             breakout_mode=str(breakout_mode),
             atr_floor_mult=float(atr_floor_mult),
         )
+        self._need = max(self.params.lookback + 1,
+                         self.params.atr_period + 2,
+                         (self.params.ema_filter or 0) + 2)
+        # ewm-vekter regnes én gang (samme avledning som pandas)
+        self._atr_w = _ewm_weights(_wilder_com(self.params.atr_period))
+        self._ema_com = _span_com(self.params.ema_filter or 1)
+        self._ema_w = _ewm_weights(self._ema_com)
+        # Trigg-modus avgjøres én gang, ikke med strengsammenligning per bar
+        self._mode_intra = self.params.breakout_mode == "intra"
+        self._reset_state()
 
     # --- Properties for kompatibilitet med StrategyBase (read-only) ---
     @property
@@ -46,81 +107,208 @@ class DonchianBreakout(StrategyBase):
     def default_symbol(self) -> Optional[str]:
         return self._default_symbol
 
+    def on_start(self) -> None:
+        # Betal ev. JIT-kompilering av kjernene før første bar
+        _kernels.warmup()
+        # Ny kjøring = ny serie; ingen state fra forrige kjøring skal gjenbrukes
+        self._reset_state()
+
     # --- Intern beregning ---
-    def _ema(self, s: pd.Series, period: int) -> pd.Series:
-        return s.ewm(span=period, adjust=False).mean()
-
-    def _atr(self, df: pd.DataFrame, period: int) -> pd.Series:
-        high = df["high"].astype(float)
-        low  = df["low"].astype(float)
-        close = df["close"].astype(float)
-        prev_close = close.shift(1)
-        tr1 = (high - low).abs()
-        tr2 = (high - prev_close).abs()
-        tr3 = (low - prev_close).abs()
-        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        return tr.ewm(alpha=1.0/float(period), adjust=False).mean()  # Wilder approx
+    def _ema(self, s: pd.Series, period: int) -> np.ndarray:
+        return _kernels.ewm(s.to_numpy(dtype=np.float64), _span_com(period))
+
+    def _atr(self, df: pd.DataFrame, period: int) -> np.ndarray:
+        high = df["high"].to_numpy(dtype=np.float64)
+        low = df["low"].to_numpy(dtype=np.float64)
+        close = df["close"].to_numpy(dtype=np.float64)
+        prev_close = np.empty_like(close)
+        prev_close[0] = np.nan
+        prev_close[1:] = close[:-1]
+        # fmax hopper over NaN (første bar uten prev_close) slik concat(...).max(axis=1) gjorde
+        tr = np.fmax(np.fmax(np.abs(high - low), np.abs(high - prev_close)), np.abs(low - prev_close))
+        return _kernels.ewm(tr, _wilder_com(period))  # Wilder approx
 
     def _compute_bands(self, df: pd.DataFrame, lookback: int) -> tuple[float, float]:
-        window = int(lookback)
-        hi = float(df["high"].rolling(window=window, min_periods=window).max().iloc[-2])
-        lo = float(df["low"].rolling(window=window, min_periods=window).min().iloc[-2])
-        return hi, lo
+        # Kun for df uten 'time' (ingen nøkkel for inkrementell state). Båndet trenger bare
+        # de 'lookback' barene før siste, så samme kjerne som BreakoutClose bruker holder –
+        # ingen rolling() over hele historikken.
+        hi, lo = _kernels.donchian(df["high"].to_numpy(dtype=np.float64),
+                                   df["low"].to_numpy(dtype=np.float64), int(lookback))
+        return float(hi), float(lo)
 
-    def _passes_trend_filter(self, df: pd.DataFrame) -> tuple[bool, Optional[str]]:
-        if not self.params.ema_filter:
+    def _reset_state(self) -> None:
+        # Inkrementell indikator-state over *ferdige* barer (alle unntatt siste)
+        self._state_t: Optional[int] = None      # tid for siste ferdige bar staten dekker
+        # (high, low, close) for den baren – skiller en annen serie med samme tider
+        # (annet symbol, korrigert historikk) fra den staten er bygget på
+        self._state_bar: Optional[Tuple[float, float, float]] = None
+        # Monotone deques med (bar-tid, verdi): fallende highs / stigende lows. Alle
+        # elementer er distinkte barer, så flere enn 'lookback' betyr at de eldste er ute
+        # av vinduet – maxlen holder minnet fast uansett hvor lenge backtesten går.
+        n = self.params.lookback
+        self._hi_dq: Deque[Tuple[int, float]] = deque(maxlen=n)
+        self._lo_dq: Deque[Tuple[int, float]] = deque(maxlen=n)
+        self._atr_prev: float = 0.0              # Wilder-ATR
+        self._atr_last_close: float = 0.0        # close (neste bars prev_close)
+        self._ema_prev: float = 0.0              # trendfilter-EMA
+
+    def _advance(self, t: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> None:
+        """
+        Ta inn barer som er blitt ferdige siden forrige kall i Donchian-dequene,
+        Wilder-ATR og trendfilter-EMA. Nøkkelen er bar-tid (ikke len(df)), så det virker
+        både når vinduet vokser (backtest) og når det glir (runneren henter fast antall
+        barer). Er ingen nye barer ferdige (samme bar kalt igjen) er dette én sammenligning.
+        Første kall, hull, data som går bakover eller en bar som ikke har samme
+        high/low/close som da den ble tatt inn (annen serie med samme tider) bygger
+        staten på nytt fra vinduet; ellers fortsetter ATR/EMA fra første bar som ble
+        sett i stedet for vindusstart.
+        ATR/EMA føres med samme aritmetikk som pandas' ewm, så verdiene er bit-like med
+        _atr/_ema når vinduet vokser.
+        """
+        end = len(t) - 1          # barene [0, end) er ferdige
+        last_t = int(t[end - 1])
+        if last_t == self._state_t and self._state_bar == (high[end - 1], low[end - 1], close[end - 1]):
+            return
+
+        p = self.params
+        first = end - p.lookback  # første bar i båndet
+        hi_dq, lo_dq = self._hi_dq, self._lo_dq
+        w_old, w_new = self._atr_w
+        start = _resume_at(t, self._state_t)
+        if start is not None and self._state_bar != (high[start - 1], low[start - 1], close[start - 1]):
+            start = None
+        if start is None:
+            hi_dq.clear()
+            lo_dq.clear()
+            band_start = first
+            atr, pc = _kernels.wilder_atr(high, low, close, 0, end, 0.0, 0.0, w_old, w_new)
+            if p.ema_filter:
+                self._ema_prev = float(_kernels.ewm_last(close, 0, end, 0.0, self._ema_com))
+        else:
+            band_start = max(start, first)
+            atr, pc = _kernels.wilder_atr(high, low, close, start, end,
+                                          self._atr_prev, self._atr_last_close, w_old, w_new)
+            if p.ema_filter:
+                self._ema_prev = float(_kernels.ewm_last(close, start, end, self._ema_prev, self._ema_com))
+        self._atr_prev = float(atr)
+        self._atr_last_close = float(pc)
+
+        for i in range(band_start, end):
+            ti = int(t[i])
+            h = float(high[i])
+            lo_i = float(low[i])
+            while hi_dq and hi_dq[-1][1] <= h:
+                hi_dq.pop()
+            hi_dq.append((ti, h))
+            while lo_dq and lo_dq[-1][1] >= lo_i:
+                lo_dq.pop()
+            lo_dq.append((ti, lo_i))
+        t_first = int(t[first])
+        while hi_dq[0][0] < t_first:
+            hi_dq.popleft()
+        while lo_dq[0][0] < t_first:
+            lo_dq.popleft()
+
+        self._state_t = last_t
+        self._state_bar = (float(high[end - 1]), float(low[end - 1]), float(close[end - 1]))
+
+    def _atr_now(self, high: float, low: float) -> float:
+        """ATR inkludert siste (ev. uferdige) bar – regnes foreløpig, lagres ikke."""
+        pc = self._atr_last_close
+        tr = max(abs(high - low), abs(high - pc), abs(low - pc))
+        atr = self._atr_prev
+        if atr != tr:
+            w_old, w_new = self._atr_w
+            atr = (w_old * atr + w_new * tr) / (w_old + w_new)
+        return atr
+
+    def _ema_now(self, close: float) -> float:
+        """Trendfilter-EMA inkludert siste (ev. uferdige) bar – regnes foreløpig, lagres ikke."""
+        ema = self._ema_prev
+        if ema != close:
+            w_old, w_new = self._ema_w
+            ema = (w_old * ema + w_new * close) / (w_old + w_new)
+        return ema
+
+    def _passes_trend_filter(self, price: float, ema_last: Optional[float]) -> tuple[bool, Optional[str]]:
+        if ema_last is None:
             return True, None
-        ema = self._ema(df["close"].astype(float), int(self.params.ema_filter))
-        price = float(df["close"].iloc[-1])
-        ema_last = float(ema.iloc[-1])
         if price > ema_last:  return True, "long"
         if price < ema_last:  return True, "short"
         return False, None
 
-    def _entry_price(self, df: pd.DataFrame) -> float:
-        return float(df["close"].iloc[-1])  # runner legger market-ordre
-
     def _make_signal(self, side: str, entry: float, atr_val: float) -> Optional[Signal]:
         if self.params.atr_floor_mult and self.params.atr_floor_mult > 0.0:
             atr_val = max(atr_val, self.params.atr_floor_mult * entry / 10000.0)
-        if atr_val <= 0.0 or not np.isfinite(atr_val):
+        if atr_val <= 0.0 or not math.isfinite(atr_val):
             return None
-        sl_dist = float(atr_val)
-        rr = float(self.params.rr)
+        sl_dist = atr_val
+        rr = self.params.rr
         if side == "buy":
             sl = entry - sl_dist
             tp = entry + rr * sl_dist
         else:
             sl = entry + sl_dist
             tp = entry - rr * sl_dist
-        return Signal(side=side, price=float(entry), meta={"sl": float(sl), "tp": float(tp)})
+        return Signal(side=side, price=entry, meta={"sl": sl, "tp": tp})
 
-    # --- Kalles fra runner ---
-    def on_bar(self, df: pd.DataFrame) -> Optional[Signal]:
-        need = max(self.params.lookback + 1,
-                   self.params.atr_period + 2,
-                   (self.params.ema_filter or 0) + 2)
-        if len(df) < need:
-            return None
+    def _triggers(self, high: float, low: float, close: float, hi: float, lo: float) -> tuple[bool, bool]:
+        """(buy-brudd, sell-brudd) for siste bar mot båndene, etter breakout_mode."""
+        if self._mode_intra:
+            return high > hi, low < lo
+        return close > hi, close < lo
 
-        ok, bias = self._passes_trend_filter(df)
+    def _decide(self, buy_trig: bool, sell_trig: bool, close: float,
+                atr_val: float, ema_last: Optional[float]) -> Optional[Signal]:
+        ok, bias = self._passes_trend_filter(close, ema_last)
         if not ok:
             return None
 
-        hi, lo = self._compute_bands(df, self.params.lookback)
-
-        if self.params.breakout_mode == "intra":
-            px_high = float(df["high"].iloc[-1])
-            px_low  = float(df["low"].iloc[-1])
-        else:
-            px_high = float(df["close"].iloc[-1])
-            px_low  = float(df["close"].iloc[-1])
+        entry = close  # runner legger market-ordre
 
-        atr_val = float(self._atr(df, self.params.atr_period).iloc[-1])
-        entry = self._entry_price(df)
-
-        if (bias in (None, "long")) and (px_high > hi):
+        if (bias in (None, "long")) and buy_trig:
             return self._make_signal("buy", entry, atr_val)
-        if (bias in (None, "short")) and (px_low < lo):
+        if (bias in (None, "short")) and sell_trig:
             return self._make_signal("sell", entry, atr_val)
         return None
+
+    # --- Kalles fra runner ---
+    def on_bar(self, df: pd.DataFrame) -> Optional[Signal]:
+        if BarFrame.has_time_key(df):
+            return self.on_bar_np(BarFrame.from_df(df))
+
+        # Uten brukbar bar-tid finnes ingen nøkkel for inkrementell state – regn vektorisert
+        p = self.params
+        if len(df) < self._need:
+            return None
+        hi, lo = self._compute_bands(df, p.lookback)
+        high = float(df["high"].iat[-1])
+        low = float(df["low"].iat[-1])
+        close = float(df["close"].iat[-1])
+        buy_trig, sell_trig = self._triggers(high, low, close, hi, lo)
+        if not (buy_trig or sell_trig):
+            return None
+        atr_val = float(self._atr(df, p.atr_period)[-1])
+        ema_last = float(self._ema(df["close"], p.ema_filter)[-1]) if p.ema_filter else None
+        return self._decide(buy_trig, sell_trig, close, atr_val, ema_last)
+
+    def on_bar_np(self, bars: BarFrame) -> Optional[Signal]:
+        if len(bars) < self._need:
+            return None
+
+        high_a = np.asarray(bars.high, dtype=np.float64)
+        low_a = np.asarray(bars.low, dtype=np.float64)
+        close_a = np.asarray(bars.close, dtype=np.float64)
+        self._advance(bars.time, high_a, low_a, close_a)
+
+        # Siste bars verdier leses én gang og gjenbrukes under
+        high = float(high_a[-1])
+        low = float(low_a[-1])
+        close = float(close_a[-1])
+        buy_trig, sell_trig = self._triggers(high, low, close, self._hi_dq[0][1], self._lo_dq[0][1])
+        if not (buy_trig or sell_trig):
+            # Vanligste tilfelle: ingen brudd. Staten er alt ført i _advance, så
+            # foreløpig ATR/EMA for siste bar trengs ikke.
+            return None
+        ema_last = self._ema_now(close) if self.params.ema_filter else None
+        return self._decide(buy_trig, sell_trig, close, self._atr_now(high, low), ema_last)
@@ -0,0 +1,77 @@
+# tests/conftest.py
+from __future__ import annotations
+
+from types import SimpleNamespace as NS
+from typing import Any, Dict, List
+
+import pytest
+
+from .helpers import make_rates
+
+
+class FakeMT5:
+    """Minimal terminal for testene: bars, symbolregler, posisjoner og ordrelogg."""
+
+    TIMEFRAME_M1, TIMEFRAME_M5, TIMEFRAME_M15, TIMEFRAME_M30 = 1, 5, 15, 30
+    TIMEFRAME_H1, TIMEFRAME_H4, TIMEFRAME_D1 = 16385, 16388, 16408
+    ORDER_TYPE_BUY, ORDER_TYPE_SELL = 0, 1
+    TRADE_ACTION_DEAL, TRADE_ACTION_SLTP = 1, 6
+    ORDER_TIME_GTC = 0
+    ORDER_FILLING_IOC = 1
+    TRADE_RETCODE_DONE = 10009
+
+    def __init__(self) -> None:
+        self.rates = make_rates(500)
+        self.positions: List[Any] = []
+        self.sent: List[Dict[str, Any]] = []
+        self.calls: List[str] = []
+        self.equity = 10_000.0
+        self.symbol = NS(visible=True, point=0.01, stops_level=10, trade_tick_size=0.01,
+                         trade_tick_value=1.0, volume_min=0.01, volume_max=100.0, volume_step=0.01)
+
+    def last_error(self):
+        return (1, "ok")
+
+    def symbol_info(self, symbol):
+        self.calls.append("symbol_info")
+        return self.symbol
+
+    def symbol_select(self, symbol, enable):
+        return True
+
+    def account_info(self):
+        return NS(login=1, server="s", name="n", equity=self.equity)
+
+    def copy_rates_from_pos(self, symbol, timeframe, start, count):
+        self.calls.append("copy_rates_from_pos")
+        n = len(self.rates)
+        return self.rates[max(0, n - start - count):n - start].copy()
+
+    def positions_get(self, **kwargs):
+        self.calls.append("positions_get")
+        ps = self.positions
+        if "ticket" in kwargs:
+            ps = [p for p in ps if p.ticket == kwargs["ticket"]]
+        if "symbol" in kwargs:
+            ps = [p for p in ps if p.symbol == kwargs["symbol"]]
+        return tuple(ps)
+
+    def order_send(self, req):
+        self.sent.append(dict(req))
+        return NS(retcode=self.TRADE_RETCODE_DONE, order=len(self.sent), price=1.0)
+
+
+@pytest.fixture
+def fake_mt5(monkeypatch):
+    import broker.mt5_client as mt5_client
+    import risk.position_sizing as position_sizing
+
+    fake = FakeMT5()
+    monkeypatch.setattr(mt5_client, "mt5", fake)
+    monkeypatch.setattr(position_sizing, "mt5", fake)
+    monkeypatch.setattr(position_sizing, "_equity_cache", None)
+    mt5_client._order_types.cache_clear()
+    position_sizing.invalidate_symbol()
+    yield fake
+    mt5_client._order_types.cache_clear()
+    position_sizing.invalidate_symbol()
@@ -0,0 +1,23 @@
+# tests/helpers.py
+from __future__ import annotations
+
+import numpy as np
+
+RATES_DTYPE = np.dtype([
+    ("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"),
+    ("tick_volume", "<u8"), ("spread", "<i4"), ("real_volume", "<u8"),
+])
+
+
+def make_rates(n: int, seed: int = 0, t0: int = 1_700_000_000, step: int = 900) -> np.ndarray:
+    """Tilfeldig-gang OHLC som MT5s structured array (priser på 2 desimaler)."""
+    rng = np.random.default_rng(seed)
+    c = np.round(100.0 + np.cumsum(rng.normal(0.0, 0.5, n)), 2)
+    a = np.zeros(n, RATES_DTYPE)
+    a["time"] = t0 + np.arange(n, dtype=np.int64) * step
+    a["open"] = c
+    a["close"] = c
+    a["high"] = c + np.round(rng.random(n), 2)
+    a["low"] = c - np.round(rng.random(n), 2)
+    a["tick_volume"] = 1
+    return a
@@ -0,0 +1,137 @@
+# tests/reference.py
+"""
+Den opprinnelige pandas-logikken til strategiene, brukt som fasit: de optimaliserte
+strategiene skal gi samme signaler som denne på et voksende vindu.
+Returnerer (side, entry, sl, tp) eller None.
+"""
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+Decision = Optional[Tuple[str, float, float, float]]
+
+
+def donchian_breakout(df: pd.DataFrame, lookback: int = 20, atr_period: int = 14, rr: float = 3.0,
+                      ema_filter: Optional[int] = 200, breakout_mode: str = "close",
+                      atr_floor_mult: float = 0.0) -> Decision:
+    need = max(lookback + 1, atr_period + 2, (ema_filter or 0) + 2)
+    if len(df) < need:
+        return None
+    close_s = df["close"].astype(float)
+    price = float(close_s.iloc[-1])
+    bias = None
+    if ema_filter:
+        ema_last = float(close_s.ewm(span=ema_filter, adjust=False).mean().iloc[-1])
+        if price > ema_last:
+            bias = "long"
+        elif price < ema_last:
+            bias = "short"
+        else:
+            return None
+
+    hi = float(df["high"].rolling(lookback, min_periods=lookback).max().iloc[-2])
+    lo = float(df["low"].rolling(lookback, min_periods=lookback).min().iloc[-2])
+    if breakout_mode == "intra":
+        px_high, px_low = float(df["high"].iloc[-1]), float(df["low"].iloc[-1])
+    else:
+        px_high = px_low = price
+
+    high, low = df["high"].astype(float), df["low"].astype(float)
+    prev_close = close_s.shift(1)
+    tr = pd.concat([(high - low).abs(), (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+    atr_val = float(tr.ewm(alpha=1.0 / float(atr_period), adjust=False).mean().iloc[-1])
+
+    if bias in (None, "long") and px_high > hi:
+        side = "buy"
+    elif bias in (None, "short") and px_low < lo:
+        side = "sell"
+    else:
+        return None
+    if atr_floor_mult > 0.0:
+        atr_val = max(atr_val, atr_floor_mult * price / 10000.0)
+    if atr_val <= 0.0 or not np.isfinite(atr_val):
+        return None
+    if side == "buy":
+        return side, price, price - atr_val, price + rr * atr_val
+    return side, price, price + atr_val, price - rr * atr_val
+
+
+class BreakoutCloseRef:
+    """Opprinnelig BreakoutClose.on_bar, inkludert retest-state."""
+
+    def __init__(self, lookback: int = 10, swing_lookback: int = 3, atr_period: int = 14,
+                 atr_floor_mult: float = 0.25, breakout_mode: str = "intra",
+                 retest_entries: bool = True, retest_window: int = 5, max_adds: int = 1) -> None:
+        self.lookback = lookback
+        self.swing_lookback = swing_lookback
+        self.atr_period = atr_period
+        self.atr_floor_mult = atr_floor_mult
+        self.breakout_mode = breakout_mode
+        self.retest_entries = retest_entries
+        self.retest_window = retest_window
+        self.max_adds = max_adds
+        self._break_price: Optional[float] = None
+        self._break_side: Optional[str] = None
+        self._break_index: Optional[int] = None
+        self._adds = 0
+
+    def _sl_tp(self, side: str, entry: float, df: pd.DataFrame, atr: float):
+        lb = self.swing_lookback
+        if len(df) < lb + 2:
+            return None
+        floor = self.atr_floor_mult * atr
+        if side == "buy":
+            swing = float(df["low"].iloc[-(lb + 1):-1].min())
+            sl = min(entry - 1e-6, max(swing, entry - floor))
+            if sl >= entry:
+                return None
+            return sl, entry + 2.0 * (entry - sl)
+        swing = float(df["high"].iloc[-(lb + 1):-1].max())
+        sl = max(entry + 1e-6, min(swing, entry + floor))
+        if sl <= entry:
+            return None
+        return sl, entry - 2.0 * (sl - entry)
+
+    def on_bar(self, df: pd.DataFrame) -> Decision:
+        if len(df) < max(self.lookback, self.swing_lookback, self.atr_period) + 2:
+            return None
+        h, l, c = df["high"], df["low"], df["close"]
+        tr = np.maximum(h - l, np.maximum((h - c.shift(1)).abs(), (l - c.shift(1)).abs()))
+        atr = tr.rolling(self.atr_period, min_periods=self.atr_period).mean().iloc[-1]
+        if pd.isna(atr) or atr <= 0:
+            return None
+        atr = float(atr)
+        highest_n = float(h.rolling(self.lookback).max().iloc[-2])
+        lowest_n = float(l.rolling(self.lookback).min().iloc[-2])
+        close, high, low = float(c.iloc[-1]), float(h.iloc[-1]), float(l.iloc[-1])
+        if self.breakout_mode == "close":
+            buy_trig, sell_trig = close > highest_n, close < lowest_n
+        else:
+            buy_trig, sell_trig = high > highest_n, low < lowest_n
+
+        for side, trig, level in (("buy", buy_trig, highest_n), ("sell", sell_trig, lowest_n)):
+            if not trig:
+                continue
+            if self.breakout_mode == "close":
+                entry = close
+            else:
+                entry = max(close, level) if side == "buy" else min(close, level)
+            res = self._sl_tp(side, entry, df, atr)
+            if res is None:
+                return None
+            self._break_price, self._break_side = level, side
+            self._break_index, self._adds = len(df) - 1, 0
+            return side, entry, res[0], res[1]
+
+        if (self.retest_entries and self._break_price is not None and self._adds < self.max_adds
+                and len(df) - 1 - self._break_index <= self.retest_window
+                and low <= self._break_price <= high):
+            res = self._sl_tp(self._break_side, close, df, atr)
+            if res is None:
+                return None
+            self._adds += 1
+            return self._break_side, close, res[0], res[1]
+        return None
@@ -0,0 +1,39 @@
+# tests/test_config.py
+from __future__ import annotations
+
+import pytest
+
+from core.config import Settings
+
+
+def _settings(**kw) -> Settings:
+    return Settings(_env_file=None, **kw)
+
+
+def test_legacy_maps():
+    s = _settings(accounts_raw="MAIN:123, TEST:456,bad,X:abc", passwords_raw="MAIN:pw", servers_raw="MAIN:Srv-1")
+    assert s.accounts == {"MAIN": 123, "TEST": 456}
+    assert s.get_account_id() == 123
+    assert s.get_account_id("TEST") == 456
+    assert s.get_login_params("MAIN") == (123, "MAIN", "pw", "Srv-1")
+
+
+def test_json_maps_allow_commas_and_colons_in_values():
+    s = _settings(accounts_raw='{"MAIN": 123, "TEST": "456", "FLAG": true}',
+                  passwords_raw='{"MAIN": "p,a:ss"}', servers_raw=' {"MAIN": "Broker:Live,1"}')
+    assert s.accounts == {"MAIN": 123, "TEST": 456}
+    assert s.get_login_params(123) == (123, "MAIN", "p,a:ss", "Broker:Live,1")
+
+
+def test_json_map_errors():
+    with pytest.raises(ValueError):
+        _settings(accounts_raw="{not json")
+    with pytest.raises(ValueError):
+        Settings._parse_json_map("[1, 2]")
+
+
+def test_default_account_resolution():
+    assert _settings(accounts_raw="A:1,B:2", account_key="B").get_account_id() == 2
+    assert _settings(accounts_raw="A:1", account_id=9).get_account_id() == 9
+    with pytest.raises(ValueError):
+        _settings().get_account_id()
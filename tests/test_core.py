@@ -0,0 +1,32 @@
+# tests/test_core.py
+from __future__ import annotations
+
+import logging
+import queue
+
+import pytest
+
+from core.lazy import lazy_import
+from core.logging import _RawQueueHandler
+
+
+def test_lazy_import_of_missing_module_fails_on_use():
+    mod = lazy_import("definitely_not_installed_xyz")
+    assert not hasattr(mod, "__file__")
+    with pytest.raises(ModuleNotFoundError):
+        mod.initialize()
+
+
+def test_lazy_import_returns_loaded_module():
+    import json
+    assert lazy_import("json") is json
+
+
+def test_raw_queue_handler_defers_formatting():
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _RawQueueHandler(q)
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "a=%s", (1,), None)
+    handler.emit(record)
+    queued = q.get_nowait()
+    assert queued is record and queued.args == (1,) and queued.msg == "a=%s"
+    assert logging.Formatter("%(message)s").format(queued) == "a=1"
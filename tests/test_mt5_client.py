@@ -0,0 +1,139 @@
+# tests/test_mt5_client.py
+from __future__ import annotations
+
+import importlib
+import sys
+from types import SimpleNamespace as NS
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from broker.mt5_client import MT5Client
+
+from .helpers import make_rates
+
+TF = 15
+
+
+def _full(fake, count):
+    return MT5Client._rates_to_df(fake.copy_rates_from_pos("X", TF, 0, count))
+
+
+def test_rates_df_incremental_matches_full_fetch(fake_mt5):
+    all_rates = make_rates(700, seed=1)
+    fake_mt5.rates = all_rates[:400].copy()
+    client = MT5Client()
+    pd.testing.assert_frame_equal(client.rates_df("X", TF, 300), _full(fake_mt5, 300))
+
+    for n in range(401, 700):
+        fake_mt5.rates = all_rates[:n].copy()
+        # Siste bar er fortsatt under utvikling: endret close skal erstatte den cachede
+        fake_mt5.rates["close"][-1] += 0.01
+        before = len(fake_mt5.calls)
+        got = client.rates_df("X", TF, 300)
+        assert fake_mt5.calls[before:].count("copy_rates_from_pos") == 1
+        pd.testing.assert_frame_equal(got, _full(fake_mt5, 300))
+
+
+def test_rates_df_falls_back_to_full_fetch_on_gap(fake_mt5):
+    all_rates = make_rates(600, seed=2)
+    fake_mt5.rates = all_rates[:400].copy()
+    client = MT5Client()
+    client.rates_df("X", TF, 300)
+    # Flere nye barer enn den inkrementelle hentingen dekker
+    fake_mt5.rates = all_rates[:450].copy()
+    pd.testing.assert_frame_equal(client.rates_df("X", TF, 300), _full(fake_mt5, 300))
+
+
+def test_rates_df_returns_copy_not_cache(fake_mt5):
+    client = MT5Client()
+    df = client.rates_df("X", TF, 300)
+    df["sma"] = df["close"].rolling(5).mean()
+    df.loc[df.index[0], "close"] = -1.0
+    again = client.rates_df("X", TF, 300)
+    assert "sma" not in again.columns
+    pd.testing.assert_frame_equal(again, _full(fake_mt5, 300))
+
+
+def test_rates_to_df_matches_baseline_construction():
+    rates = make_rates(50, seed=4)
+    want = pd.DataFrame(rates)
+    want["time"] = pd.to_datetime(want["time"], unit="s")
+    want = want[["time", "open", "high", "low", "close", "tick_volume"]]
+    got = MT5Client._rates_to_df(rates)
+    pd.testing.assert_frame_equal(got, want)
+
+
+def test_batch_reports_invalid_side_without_stopping(fake_mt5):
+    client = MT5Client()
+    res = client.market_orders_batch([
+        dict(symbol="X", side="buy", volume=0.1),
+        dict(symbol="X", side="long", volume=0.1),
+        dict(symbol="X", side="sell", volume=0.2, sl=99.0, tp=101.0),
+    ])
+    assert res[1] == (False, None, None)
+    assert res[0][0] and res[2][0]
+    assert [r["type"] for r in fake_mt5.sent] == [fake_mt5.ORDER_TYPE_BUY, fake_mt5.ORDER_TYPE_SELL]
+    assert "sl" not in fake_mt5.sent[0] and fake_mt5.sent[1]["sl"] == 99.0
+
+
+def test_close_position_uses_live_position_bound_to_ticket(fake_mt5):
+    fake_mt5.positions = [NS(ticket=7, symbol="X", type=fake_mt5.ORDER_TYPE_BUY, volume=0.2)]
+    ok, _, _ = MT5Client().close_position_by_ticket(7)
+    assert ok
+    req = fake_mt5.sent[-1]
+    assert req["position"] == 7 and req["volume"] == 0.2 and req["type"] == fake_mt5.ORDER_TYPE_SELL
+
+
+def test_close_position_skips_closed_ticket(fake_mt5):
+    fake_mt5.positions = [NS(ticket=8, symbol="X", type=fake_mt5.ORDER_TYPE_BUY, volume=0.5)]
+    assert MT5Client().close_position_by_ticket(7) == (False, None, None)
+    assert fake_mt5.sent == []
+
+
+def test_rates_arrays_are_views_on_rates(fake_mt5):
+    arrays = MT5Client().rates_arrays("X", TF, 50)
+    assert arrays["close"].dtype == np.float64 and len(arrays["time"]) == 50
+
+
+def test_rates_pl_matches_rates_df(fake_mt5):
+    pl = pytest.importorskip("polars")
+    client = MT5Client()
+    got = client.rates_pl("X", TF, 120)
+    want = client.rates_df("X", TF, 120)
+    assert got.columns == list(want.columns)
+    assert isinstance(got.schema["time"], pl.Datetime)
+    assert [got.schema[c] for c in ("open", "high", "low", "close")] == [pl.Float64] * 4
+    assert got.schema["tick_volume"] == pl.UInt64
+    assert np.array_equal(got["time"].dt.epoch("s").to_numpy(),
+                          want["time"].to_numpy().astype("datetime64[s]").astype(np.int64))
+    for col in ("open", "high", "low", "close", "tick_volume"):
+        assert np.array_equal(got[col].to_numpy(), want[col].to_numpy()), col
+
+
+@pytest.fixture
+def run_live(monkeypatch, fake_mt5):
+    # Runneren importerer MetaTrader5 direkte; feeds slår opp timeframes ved import av runneren
+    import data.feeds as feeds
+
+    monkeypatch.setitem(sys.modules, "MetaTrader5", fake_mt5)
+    monkeypatch.setattr(feeds, "mt5", fake_mt5)
+    feeds._timeframe_map.cache_clear()
+    rl = importlib.import_module("scripts.run_live")
+    monkeypatch.setattr(rl, "mt5", fake_mt5)
+    rl._RATES_CACHE.clear()
+    yield rl
+    rl._RATES_CACHE.clear()
+    feeds._timeframe_map.cache_clear()
+
+
+def test_fetch_bars_incremental_matches_full_fetch(run_live, fake_mt5):
+    all_rates = make_rates(700, seed=3)
+    for n in list(range(400, 520)) + [560, 561]:  # 560: hull større enn inkrementell henting
+        fake_mt5.rates = all_rates[:n].copy()
+        fake_mt5.rates["high"][-1] += 0.02
+        got = run_live.fetch_bars("X", TF, 300)
+        want = fake_mt5.copy_rates_from_pos("X", TF, 0, 300)
+        for col in ("time", "open", "high", "low", "close", "tick_volume"):
+            assert np.array_equal(getattr(got, col), want[col]), (n, col)
@@ -0,0 +1,47 @@
+# tests/test_position_sizing.py
+from __future__ import annotations
+
+import pytest
+
+from risk import position_sizing
+from risk.position_sizing import _round_to_step, calc_volume_for_risk, get_symbol_specs, invalidate_symbol
+
+
+def test_round_to_step_keeps_round_half_to_even():
+    for i in range(2000):
+        v = 0.005 * i
+        assert _round_to_step(v, 0.01) == round(round(v / 0.01) * 0.01, 6), v
+    assert _round_to_step(0.025, 0.01) == 0.02
+    assert _round_to_step(0.035, 0.01) == 0.04
+
+
+def test_round_to_step_strips_float_noise_and_ignores_bad_step():
+    assert _round_to_step(0.30000000000000004, 0.1) == 0.3
+    assert _round_to_step(0.123, 0.0) == 0.123
+
+
+def test_calc_volume_for_risk(fake_mt5):
+    # 1 % av 10 000 = 100; 50 ticks * 1.0 per tick = 50 per lot -> 2 lots
+    vol = calc_volume_for_risk(symbol="X", entry_price=100.0, stop_loss_price=99.5, risk_fraction=0.01)
+    assert vol == pytest.approx(2.0)
+    fake_mt5.symbol.volume_max = 1.0
+    invalidate_symbol("X")
+    assert calc_volume_for_risk(symbol="X", entry_price=100.0, stop_loss_price=99.5, risk_fraction=0.01) == 1.0
+
+
+def test_symbol_specs_are_cached_until_invalidated(fake_mt5):
+    specs = get_symbol_specs("X")
+    assert specs.min_dist == pytest.approx(0.1)
+    assert get_symbol_specs("X") is specs
+    assert fake_mt5.calls.count("symbol_info") == 1
+    invalidate_symbol("X")
+    get_symbol_specs("X")
+    assert fake_mt5.calls.count("symbol_info") == 2
+
+
+def test_symbol_specs_fallbacks(fake_mt5):
+    fake_mt5.symbol.volume_min = 0.0
+    fake_mt5.symbol.trade_tick_size = 0.0
+    specs = get_symbol_specs("X")
+    assert specs.volume_min == 0.01 and specs.tick_size == 0.01
+    assert position_sizing._specs_cache